@@ -1,25 +1,40 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # Imports =====================================================================
-import gc
+import codecs
 
 from . import specialdict
 from . import htmlelement
 
 from .htmlelement import HTMLElement
+from .htmlelement import TextElement
+from .htmlelement import CommentElement
+from .htmlelement import EndTagElement
+from .htmlelement import Matcher
+from .htmlelement import _createTokenElement
 from .htmlelement import _rotate_buff
+from .htmlelement.html_parser import _is_str
+from .htmlelement.html_parser import _parse_params
+from .htmlelement.html_parser import _parse_tag_name
+from .htmlelement.html_parser import _TAG
+from .htmlelement.html_parser import _END_TAG
+from .htmlelement.html_parser import _COMMENT
+from .htmlelement.html_parser import _NONPAIR
+from .htmlelement.html_parser import _CACHE_STRING
+from .htmlelement.html_parser import _TRACKED
+from .htmlelement.html_parser import _ChildList
+from .htmlelement.html_index import DocumentIndex
+from .htmlelement.html_source import SourceText
+
+from .builder import DOMBuilder
+from .gc_policy import paused_gc
+from .gc_policy import freeze
+from .options import ParserOptions
+from .tokenizer import Tokenizer
+from .tokenizer import StateEnum
 
 
 # Functions ===================================================================
-class StateEnum(object):
-    _cnt = (x for x in range(100))
-
-    content = next(_cnt)
-    tag = next(_cnt)
-    parameter = next(_cnt)
-    comment = next(_cnt)
-
-
 def first(inp_data):
     """
     Return first element from `inp_data`, or raise StopIteration.
@@ -40,13 +55,11 @@ def first(inp_data):
     return next(x for x in inp_data)
 
 
-def _raw_split(itxt):
+def _raw_split(itxt, classify=False, disable_gc=True):
     """
     Parse HTML from text into array filled with tags end text.
 
-    Source code is little bit unintutive, because it is state machine parser.
-
-    For better understanding, look at http://bit.ly/1rXRcJj
+    See :class:`.Tokenizer` for details.
 
     Example::
 
@@ -55,97 +68,19 @@ def _raw_split(itxt):
 
     Args:
         itxt (str): Input HTML text, which will be parsed.
+        classify (bool, default False): Return ``(token, flags, tag_name)``
+            tuples instead of strings. See :class:`.Tokenizer`.
+        disable_gc (bool, default True): Disable the garbage collector while
+            splitting. See :func:`.paused_gc`.
 
     Returns:
         list: List of strings (input splitted to tags and text).
     """
-    echr = ""
-    buff = ["", "", "", ""]
-    content = ""
-    array = []
-    next_state = 0
-    inside_tag = False
-    escaped = False
-
-    COMMENT_START = ["-", "!", "<"]
-    COMMENT_END = ["-", "-"]
-
-    gc.disable()
-
-    for c in itxt:
-        # content
-        if next_state == StateEnum.content:
-            if c == "<":
-                if content:
-                    array.append(content)
-
-                content = c
-                next_state = StateEnum.tag
-                inside_tag = False
-
-            else:
-                content += c
-
-        # html tag
-        elif next_state == StateEnum.tag:
-            if c == ">":
-                array.append(content + c)
-                content = ""
-                next_state = StateEnum.content
-
-            elif c == "'" or c == '"':
-                echr = c
-                content += c
-                next_state = StateEnum.parameter
-
-            elif c == "-" and buff[:3] == COMMENT_START:
-                if content[:-3]:
-                    array.append(content[:-3])
-
-                content = content[-3:] + c
-                next_state = StateEnum.comment
-
-            else:
-                if c == "<":   # jump back into tag instead of content
-                    array.append(content)
-                    inside_tag = True
-                    content = ""
-
-                content += c
-
-        # quotes "" / ''
-        elif next_state == StateEnum.parameter:
-            if c == echr and not escaped:  # end of quotes
-                next_state = StateEnum.tag
-
-            # unescaped end of line - this is good for invalid HTML like
-            # <a href=something">..., because it allows recovery
-            if c == "\n" and not escaped and buff[0] == ">":
-                next_state = StateEnum.content
-                inside_tag = False
-
-            content += c
-            escaped = not escaped if c == "\\" else False
-
-        # html comments
-        elif next_state == StateEnum.comment:
-            if c == ">" and buff[:2] == COMMENT_END:
-                next_state = StateEnum.tag if inside_tag else StateEnum.content
-                inside_tag = False
-
-                array.append(content + c)
-                content = ""
-            else:
-                content += c
-
-        # rotate buffer
-        buff = _rotate_buff(buff)
-        buff[0] = c
-
-    gc.enable()
-
-    if content:
-        array.append(content)
+    tokenizer = Tokenizer(classify)
+
+    with paused_gc(disable_gc):
+        array = tokenizer.feed(itxt)
+        array.extend(tokenizer.close())
 
     return array
 
@@ -170,8 +105,7 @@ def _indexOfEndTag(istack):
     cnt = 0
     opener = istack[0]
     for index, el in enumerate(istack[1:]):
-        if el.isOpeningTag() and \
-           el.getTagName().lower() == opener.getTagName().lower():
+        if el.isOpeningTag() and el._tagkey == opener._tagkey:
             cnt += 1
 
         elif el.isEndTagTo(opener):
@@ -183,51 +117,146 @@ def _indexOfEndTag(istack):
     return 0
 
 
-def _parseDOM(istack):
+def _parseDOM(istack, index=None, root=None):
     """
-    Recursively go through element array and create DOM.
+    Go through element array and create DOM.
+
+    See :class:`.DOMBuilder` for details.
 
     Args:
         istack (list): List of :class:`.HTMLElement` objects.
+        index (obj, default None): :class:`.DocumentIndex`, which will be
+            filled with the elements of the DOM.
+        root (obj, default None): Container of the tracked DOM, see
+            :attr:`.DOMBuilder.root`.
 
     Returns:
         list: DOM tree as list.
     """
-    ostack = []
-    end_tag_index = 0
+    builder = DOMBuilder(index=index, root=root)
+    builder.feed(istack)
+
+    return builder.close()
+
+
+def _new_index(options):
+    """
+    Return new :class:`.DocumentIndex`, if it should be built by the `options`.
+    """
+    if options.build_index:
+        return DocumentIndex()
+
+    return None
+
+
+def _new_container(options, source=None):
+    """
+    Return blank element, which will contain the DOM parsed with the
+    `options` from the `source`.
+
+    Changes of the DOM are tracked, if they have to invalidate the strings
+    cached by the :attr:`.ParserOptions.cache_strings`, the
+    :class:`.DocumentIndex`, or the slicing of the :class:`.SourceText`.
+    """
+    container = HTMLElement()
+
+    if options.cache_strings:
+        container._flags |= _CACHE_STRING | _TRACKED
+
+    if options.build_index:
+        container._flags |= _TRACKED
+
+    if source is not None:
+        container._flags |= _TRACKED
+        source.locateRoot(container)
+
+    return container
+
+
+def _tracking_root(container):
+    """
+    Return the `container`, if the changes of its DOM are tracked.
+    """
+    if container._flags & _TRACKED:
+        return container
+
+    return None
+
+
+def _fill_container(container, dom):
+    """
+    Put the `dom` from the :class:`.DOMBuilder` to the `container`.
+    """
+    if container._flags & _TRACKED:
+        dom = _ChildList(dom, container)
+        for el in dom:
+            el._parent = container
+
+    container._childs = dom
+
+
+def _new_source(options):
+    """
+    Return new :class:`.SourceText`, if it should be kept by the `options`.
+    """
+    if options.keep_source:
+        return SourceText()
+
+    return None
+
+
+def _createElements(tokens, options, source=None):
+    """
+    Create elements for the classified `tokens` from the :class:`.Tokenizer`.
+
+    Args:
+        tokens (list): List of ``(token, flags, tag_name)`` tuples.
+        options (obj): :class:`.ParserOptions` instance.
+        source (obj, default None): :class:`.SourceText`, where the positions
+               of the elements are recorded.
+
+    Returns:
+        list: List of :class:`.HTMLElement` objects.
+    """
+    elements = [
+        _createTokenElement(token, flags, tag_name, options)
+        for token, flags, tag_name in tokens
+    ]
 
-    def neither_nonpair_or_end_or_comment(el):
-        return not (el.isNonPairTag() or el.isEndTag() or el.isComment())
+    if source is not None:
+        for el in elements:
+            source.locate(el)
 
-    index = 0
-    while index < len(istack):
-        el = istack[index]
+    return elements
 
-        # check if this is pair tag
-        end_tag_index = _indexOfEndTag(istack[index:])
 
-        if end_tag_index == 0 and neither_nonpair_or_end_or_comment(el):
-            el.isNonPairTag(True)
+def _remove_bom(txt):
+    """
+    Remove UTF BOM from the beginning of the `txt` (prettify fails if not).
 
-        if end_tag_index == 0:
-            if not el.isEndTag():
-                ostack.append(el)
-        else:
-            el.childs = _parseDOM(istack[index + 1: end_tag_index + index])
-            el.endtag = istack[end_tag_index + index]  # reference to endtag
-            el.endtag.openertag = el
+    Both the decoded BOM and its UTF-8 bytes read as latin-1 are removed.
+    """
+    if txt[:3] == u"\xef\xbb\xbf":
+        return txt[3:]
 
-            ostack.append(el)
-            ostack.append(el.endtag)
+    if txt[:1] == u"\ufeff":
+        return txt[1:]
 
-            index = end_tag_index + index
+    return txt
 
-        index += 1
 
-    return ostack
+def _get_options(cip, options):
+    """
+    Return `options`, or :class:`.ParserOptions` made from the `cip` argument
+    if the `options` are not set.
+    """
+    if options is None:
+        return ParserOptions(cip=cip)
+
+    return options
 
 
-def parseString(txt, cip=True):
+def parseString(txt, cip=True, options=None):
     """
     Parse string `txt` and return DOM tree consisting of single linked
     :class:`.HTMLElement`.
@@ -237,6 +266,8 @@ def parseString(txt, cip=True):
         cip (bool, default True): Case Insensitive Parameters. Use special
             dictionary to store :attr:`.HTMLElement.params` as case
             insensitive.
+        options (obj, default None): :class:`.ParserOptions` instance. If
+            set, `cip` argument is ignored.
 
     Returns:
         obj: Single conteiner HTML element with blank tag, which has whole DOM\
@@ -246,23 +277,419 @@ def parseString(txt, cip=True):
     if isinstance(txt, HTMLElement):
         return txt
 
-    # remove UTF BOM (prettify fails if not)
-    if len(txt) > 3 and txt[:3] == u"\xef\xbb\xbf":
-        txt = txt[3:]
+    if len(txt) > 3:
+        txt = _remove_bom(txt)
 
-    if not cip:
-        htmlelement.html_parser.SpecialDict = dict
-    elif isinstance(htmlelement.html_parser.SpecialDict, dict):
-        htmlelement.html_parser.SpecialDict = specialdict.SpecialDict
+    options = _get_options(cip, options)
+    index = _new_index(options)
 
-    container = HTMLElement()
-    container.childs = _parseDOM([
-        HTMLElement(x) for x in _raw_split(txt)
-    ])
+    source = _new_source(options)
+    if source is not None:
+        source.append(txt)
+
+    # GC is paused for the whole parse, where almost all objects are created
+    with paused_gc(options.disable_gc):
+        tokens = _raw_split(txt, classify=True, disable_gc=False)
+
+        container = _new_container(options, source)
+        _fill_container(container, _parseDOM(
+            _createElements(tokens, options, source),
+            index,
+            _tracking_root(container)
+        ))
+
+    if index is not None:
+        container._index = index
+
+    if options.freeze_gc:
+        freeze()
 
     return container
 
 
+def _classify_token(token):
+    """
+    Classify `token`, which the :class:`.Tokenizer` couldn't classify.
+
+    Returns:
+        tuple: ``(flags, tag_name)``, see :class:`.Tokenizer`.
+    """
+    if not (token.startswith("<") and token.endswith(">")):
+        return 0, None
+
+    if token.startswith("<!--") and token.endswith("-->"):
+        return _TAG | _COMMENT, None
+
+    flags = _TAG
+    if token.startswith("</"):
+        flags |= _END_TAG
+    if token.endswith("/>"):
+        flags |= _NONPAIR
+
+    return flags, _parse_tag_name(token)
+
+
+def parseEvents(txt, handler, cip=True, options=None):
+    """
+    Parse string `txt` and report its content to the `handler`, without
+    building the DOM.
+
+    This is much faster than :func:`parseString`, when you only need to count
+    tags, or pick a few parameters, because no :class:`.HTMLElement` objects
+    are created.
+
+    `handler` may define following methods (missing methods are skipped):
+
+        - ``start(tag, params)`` for opening and nonpair tags,
+        - ``end(tag)`` for end tags and right after ``start()`` of the nonpair
+          tags,
+        - ``text(data)`` for text between the tags,
+        - ``comment(data)`` for whole comments (``<!-- .. -->``).
+
+    Example::
+
+        >>> class LinkCollector(object):
+        ...     def __init__(self):
+        ...         self.links = []
+        ...     def start(self, tag, params):
+        ...         if tag.lower() == "a" and "href" in params:
+        ...             self.links.append(params["href"])
+        >>> collector = LinkCollector()
+        >>> dhtmlparser.parseEvents('<a href="x">a</a><A HREF=y>', collector)
+        >>> collector.links
+        ['x', 'y']
+
+    Note:
+        Events are generated directly from the tokenizer, so the end tags
+        are not paired with the openers as they are in the DOM.
+
+    Args:
+        txt (str): HTML/XML string, which will be parsed.
+        handler (obj): Object with the callbacks.
+        cip (bool, default True): Case Insensitive Parameters. Use
+            :class:`.CaseInsensitiveDict` for `params` given to ``start()``.
+        options (obj, default None): :class:`.ParserOptions` instance. If
+            set, `cip` argument is ignored.
+    """
+    def skip(*args):
+        pass
+
+    start = getattr(handler, "start", skip)
+    end = getattr(handler, "end", skip)
+    text = getattr(handler, "text", skip)
+    comment = getattr(handler, "comment", skip)
+
+    options = _get_options(cip, options)
+    params_type = specialdict.CaseInsensitiveDict if options.cip else dict
+    nonpair_tags = options.nonpair_tags
+
+    def report(tokens):
+        for token, flags, tag_name in tokens:
+            if flags is None:  # not classified cheaply by the tokenizer
+                flags, tag_name = _classify_token(token)
+
+            if not flags & _TAG:
+                if token:
+                    text(token)
+                continue
+
+            if flags & _COMMENT:
+                comment(token)
+                continue
+
+            if flags & _END_TAG:
+                end(tag_name)
+                continue
+
+            params = params_type()
+            nonpair = _parse_params(token, tag_name, params) or \
+                flags & _NONPAIR or \
+                tag_name.lower() in nonpair_tags
+
+            start(tag_name, params)
+
+            if nonpair:
+                end(tag_name)
+
+    txt = _remove_bom(txt)
+    chunk_size = 64 * 1024
+    tokenizer = Tokenizer(classify=True)
+
+    # tokens are reported by chunks, so the whole list is never built
+    for offset in range(0, len(txt), chunk_size):
+        with paused_gc(options.disable_gc):
+            tokens = tokenizer.feed(txt[offset:offset + chunk_size])
+
+        report(tokens)
+
+    with paused_gc(options.disable_gc):
+        tokens = tokenizer.close()
+
+    report(tokens)
+
+
+class IncrementalParser(object):
+    """
+    Parse HTML/XML given by chunks, for example from the network or
+    decompressor, and return same DOM tree as :func:`parseString`.
+
+    State of the tokenizer is kept between the chunks, so they can be split
+    anywhere, even inside comments or quoted parameters.
+
+    Example::
+
+        >>> parser = dhtmlparser.IncrementalParser()
+        >>> for chunk in ["<html><tag PAR", 'AM="true"></h', "tml>"]:
+        ...     parser.feed(chunk)
+        >>> dom = parser.close()
+        >>> dom.find("tag")
+        [HTMLElement('<tag PARAM="true">')]
+
+    Args:
+        cip (bool, default True): Case Insensitive Parameters. See
+            :func:`parseString`.
+        options (obj, default None): :class:`.ParserOptions` instance. If
+            set, `cip` argument is ignored.
+    """
+    def __init__(self, cip=True, options=None):
+        self.options = _get_options(cip, options)
+
+        self._head = ""  # beginning of the input, until UTF BOM is detected
+        self._tokenizer = Tokenizer(classify=True)
+        self._source = _new_source(self.options)
+        self._root = _new_container(self.options, self._source)
+        self._builder = DOMBuilder(
+            index=_new_index(self.options),
+            root=_tracking_root(self._root),
+        )
+        if self._builder.index is not None:
+            # invalidated by the changes made before the parsing is finished
+            self._root._index = self._builder.index
+
+    def _feed_tokenizer(self, chunk):
+        if self._source is not None:
+            self._source.append(chunk)
+
+        return self._tokenizer.feed(chunk)
+
+    def _split(self, chunk):
+        """
+        Split `chunk` to tokens.
+        """
+        if self._head is not None:
+            self._head += chunk
+            if len(self._head) <= 3:
+                return []
+
+            chunk = _remove_bom(self._head)
+            self._head = None
+
+        return self._feed_tokenizer(chunk)
+
+    def _split_rest(self):
+        """
+        Return rest of the tokens from the tokenizer.
+        """
+        tokens = []
+        if self._head:
+            tokens = self._feed_tokenizer(self._head)
+
+        tokens.extend(self._tokenizer.close())
+        self._head = ""
+
+        return tokens
+
+    def _add_tokens(self, tokens):
+        self._builder.feed(
+            _createElements(tokens, self.options, self._source)
+        )
+
+    def feed(self, chunk):
+        """
+        Parse next `chunk` of the input.
+
+        Args:
+            chunk (str): Part of the HTML/XML string.
+        """
+        with paused_gc(self.options.disable_gc):
+            self._add_tokens(self._split(chunk))
+
+    def close(self):
+        """
+        Finish the parsing.
+
+        Returns:
+            obj: Single conteiner HTML element with blank tag, see \
+                 :func:`parseString`.
+        """
+        with paused_gc(self.options.disable_gc):
+            self._add_tokens(self._split_rest())
+
+            container = self._root
+            _fill_container(container, self._builder.close())
+
+        if self.options.freeze_gc:
+            freeze()
+
+        return container
+
+
+class IterParser(IncrementalParser):
+    """
+    Iterate over ``("start", el)`` and ``("end", el)`` events, while the
+    `source` is parsed.
+
+    Elements in the ``"end"`` events have all their :attr:`.HTMLElement.childs`
+    already parsed. When you are done with them, you can remove them from the
+    DOM using :meth:`detach`, or :meth:`clear` everything parsed so far, so
+    the memory usage doesn't grow with the size of the document.
+
+    Example::
+
+        >>> xml = dhtmlparser.ParserOptions(nonpair_tags=[])
+        >>> parser = dhtmlparser.IterParser(open("catalogue.xml"), options=xml)
+        >>> for event, el in parser:
+        ...     if event == "end" and el.getTagName() == "product":
+        ...         process(el)
+        ...         parser.clear()
+
+    Args:
+        source (str/file/iterable): HTML/XML string, file-like object with
+            ``.read()`` method, or iterable of string chunks. Files opened
+            in binary mode in python 3 are decoded as UTF-8.
+        events (tuple, default ("start", "end")): Events, which should be
+            returned.
+        cip (bool, default True): Case Insensitive Parameters. See
+            :func:`parseString`.
+        chunk_size (int, default 65536): Size of the chunks read from the
+            file-like objects.
+        options (obj, default None): :class:`.ParserOptions` instance. If
+            set, `cip` argument is ignored.
+
+    Attributes:
+        root (obj): Container element with the rest of the DOM. Set when the
+            iteration is finished.
+    """
+    def __init__(self, source, events=("start", "end"), cip=True,
+                 chunk_size=64 * 1024, options=None):
+        super(IterParser, self).__init__(cip=cip, options=options)
+
+        self.source = source
+        self.root = None
+        self.chunk_size = chunk_size
+        self.wanted_events = events
+
+        self._events = []
+        self._builder.events = self._events
+
+    def _chunks(self):
+        if isinstance(self.source, HTMLElement):
+            raise ValueError("Can't iterate over already parsed DOM!")
+
+        if hasattr(self.source, "read"):
+            return self._read_chunks()
+
+        if _is_str(self.source):
+            return [self.source]
+
+        return self.source
+
+    def _read_chunks(self):
+        """
+        Read the :attr:`source` file by :attr:`chunk_size` until its end.
+        """
+        decoder = None
+        while True:
+            chunk = self.source.read(self.chunk_size)
+            if not chunk:  # ``b""`` from the binary files in python 3
+                break
+
+            if not _is_str(chunk):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder("utf-8")()
+
+                chunk = decoder.decode(chunk)
+
+            yield chunk
+
+        if decoder is not None:
+            chunk = decoder.decode(b"", final=True)
+            if chunk:
+                yield chunk
+
+    def _drain(self):
+        events = self._events[:]
+        del self._events[:]
+
+        return [x for x in events if x[0] in self.wanted_events]
+
+    def _add_tokens_lazily(self, tokens):
+        """
+        Add `tokens` to the DOM one by one and yield the events, so the
+        :meth:`detach` and :meth:`clear` calls see the same DOM as the caller.
+        """
+        builder = self._builder
+        options = self.options
+        source = self._source
+
+        for token in tokens:
+            builder.feed(_createElements((token,), options, source))
+
+            if self._events:
+                for event in self._drain():
+                    yield event
+
+    def _split_paused(self, chunk=None):
+        """
+        Split the `chunk` (or rest of the input if not set) with paused GC.
+
+        The GC is not paused while the events are processed by the caller.
+        """
+        with paused_gc(self.options.disable_gc):
+            if chunk is None:
+                return self._split_rest()
+
+            return self._split(chunk)
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            for event in self._add_tokens_lazily(self._split_paused(chunk)):
+                yield event
+
+        for event in self._add_tokens_lazily(self._split_paused()):
+            yield event
+
+        self.root = self.close()
+
+        for event in self._drain():
+            yield event
+
+    def detach(self, el):
+        """
+        Remove finished element `el` (and its `endtag`) from the DOM.
+
+        Args:
+            el (obj): :class:`.HTMLElement` instance from the ``"end"`` event.
+
+        Raises:
+            ValueError: If the `el` is not in the DOM, or it is still opened.
+        """
+        self._builder.detach(el)
+
+        if self._source is not None:
+            self._source.discard()
+
+    def clear(self):
+        """
+        Remove all finished elements from the DOM. Only the elements which
+        are still opened are kept (without content parsed so far).
+        """
+        self._builder.clear()
+
+        if self._source is not None:
+            self._source.discard()
+
+
 def makeDoubleLinked(dom, parent=None):
     """
     Standard output from `dhtmlparser` is single-linked tree. This will make it
@@ -0,0 +1,279 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Builder, which creates DOM tree from the list of :class:`.HTMLElement`
+tokens.
+"""
+# Imports =====================================================================
+from .htmlelement.html_index import DocumentIndex
+from .htmlelement.html_parser import _ChildList
+from .htmlelement.html_parser import _TRACKED
+from .htmlelement.html_parser import _watch
+
+
+# Functions & objects =========================================================
+class DOMBuilder(object):
+    """
+    Single pass DOM builder, which uses stack of the opened elements.
+
+    Each end tag is paired with the nearest unpaired opener of the same name
+    (same rules as in :func:`.dhtmlparser._indexOfEndTag`). If the opener is
+    still on the stack, it is closed and everything opened above it is
+    converted to nonpair tag, with its content shifted to the upper level.
+
+    Elements may be given in chunks by repeated calls of :meth:`feed`.
+
+    Example::
+
+        >>> builder = DOMBuilder()
+        >>> builder.feed([HTMLElement("<h1>"), HTMLElement("<xx>")])
+        >>> builder.feed([HTMLElement("</h1>")])
+        >>> builder.close()
+        [HTMLElement('<h1><xx></h1>'), HTMLElement('')]
+
+    Attributes:
+        events (list, default None): If set, ``("start", el)`` tuple is
+            appended to this list for each opened tag and ``("end", el)``
+            for each finished tag. Nonpair tags generate both events at once.
+        index (obj, default None): If set, all elements added to the DOM are
+            added also to this :class:`.DocumentIndex`.
+        root (obj, default None): If set, changes of the elements are tracked
+            (see :meth:`.HTMLElement._changed`) and the elements on the top
+            level of the DOM report them to this container.
+    """
+    def __init__(self, events=None, index=None, root=None):
+        self.events = events
+        self.index = index
+        self.root = root
+
+        self._ostack = []
+
+        # stack of (opener, index of its first child in the ostack)
+        self._openers = []
+
+        # lowercased name -> stack of (opener, index in the openers) of the
+        # opened elements, and counts of the openers converted to nonpair
+        # tags, which still take their end tags
+        self._unpaired = {}
+
+    def feed(self, istack):
+        """
+        Add elements to the DOM.
+
+        Args:
+            istack (list): List of :class:`.HTMLElement` objects.
+        """
+        ostack = self._ostack
+        openers = self._openers
+        unpaired = self._unpaired
+        events = self.events
+        index = self.index
+        root = self.root
+
+        for el in istack:
+            # changes are reported to the innermost opener, until the parent
+            # of the `el` is known
+            if root is not None:
+                el._parent = openers[-1][0] if openers else root
+                el._flags |= _TRACKED
+                if el._params is not None:
+                    _watch(el._params, el)
+
+            if el.isOpeningTag():
+                ostack.append(el)
+                if index is not None:
+                    index.add(el)
+
+                unpaired.setdefault(el._tagkey, []).append(
+                    (el, len(openers))
+                )
+                openers.append((el, len(ostack)))
+
+                if events is not None:
+                    events.append(("start", el))
+                continue
+
+            if not el.isEndTag():
+                ostack.append(el)
+                if index is not None:
+                    index.add(el)
+
+                if root is not None and el._childs.__class__ is list:
+                    el._childs = _ChildList((), el)  # nonpair tags
+
+                if events is not None and el.isTag() and not el.isComment():
+                    events.append(("start", el))
+                    events.append(("end", el))
+                continue
+
+            # end tags without opener are thrown away
+            same_name = unpaired.get(el._tagkey)
+            if not same_name:
+                continue
+
+            entry = same_name.pop()
+
+            # opener was already converted to nonpair by one of its parents
+            if entry.__class__ is int:
+                if entry > 1:
+                    same_name.append(entry - 1)
+                continue
+
+            opener, depth = entry
+
+            self._close_unclosed(depth + 1)
+
+            first_child = openers[depth][1]
+            del openers[depth:]
+
+            if root is not None:
+                opener._childs = _ChildList(ostack[first_child:], opener)
+                for child in opener._childs:
+                    child._parent = opener
+                el._parent = openers[-1][0] if openers else root
+            else:
+                opener._childs = ostack[first_child:]
+            del ostack[first_child:]
+
+            opener.endtag = el  # reference to endtag
+            opener._str_cache = None  # it may be serialized before the childs
+            el.openertag = opener
+            ostack.append(el)
+            if index is not None:
+                index.add(el)
+
+            if events is not None:
+                events.append(("end", opener))
+
+    def _close_unclosed(self, depth):
+        """
+        Convert elements opened above `depth` in the stack to nonpair tags.
+
+        Args:
+            depth (int): Index in the stack of the opened elements.
+        """
+        for unclosed, _ in reversed(self._openers[depth:]):
+            unclosed._setNonPairTag(True)  # not reported, it has no childs yet
+            self._count_unpaired(unclosed)
+
+            if self.events is not None:
+                self.events.append(("end", unclosed))
+
+        del self._openers[depth:]
+
+    def _count_unpaired(self, unclosed):
+        """
+        Replace the `unclosed` opener in the :attr:`_unpaired` by a count, so
+        it still takes one end tag of its name, but the builder doesn't keep
+        reference to it (and its subtree) after it is released.
+
+        Args:
+            unclosed (obj): Opener converted to nonpair tag.
+        """
+        same_name = self._unpaired[unclosed._tagkey]
+
+        # the openers above were converted already, and counted
+        count = 1
+        entry = same_name.pop()
+        while entry.__class__ is int:
+            count += entry
+            entry = same_name.pop()
+
+        if same_name and same_name[-1].__class__ is int:
+            count += same_name.pop()
+
+        same_name.append(count)
+
+    def _release(self, removed):
+        """
+        Stop reporting the changes of the `removed` elements to the DOM.
+        """
+        if self.root is None:
+            return
+
+        for el in removed:
+            el._parent = None
+
+    def detach(self, el):
+        """
+        Remove finished element `el` and its `endtag` from the DOM, which is
+        being built.
+
+        This is fast for the elements, which were finished recently.
+
+        Args:
+            el (obj): :class:`.HTMLElement` instance.
+
+        Raises:
+            ValueError: If the `el` is not in the DOM, or it is still opened.
+        """
+        ostack = self._ostack
+        for index in range(len(ostack) - 1, -1, -1):
+            if ostack[index] is el:
+                break
+        else:
+            raise ValueError("Element is not in the DOM!")
+
+        if any(opener is el for opener, _ in self._openers):
+            raise ValueError("Element is still opened!")
+
+        end = index + 1
+        if el.endtag is not None and end < len(ostack) and \
+           ostack[end] is el.endtag:
+            end += 1
+
+        if self.index is not None:
+            for removed in ostack[index:end]:
+                self.index.remove(removed)
+
+        self._release(ostack[index:end])
+        del ostack[index:end]
+
+        self._openers[:] = [
+            (opener, first_child - (end - index) * (first_child > index))
+            for opener, first_child in self._openers
+        ]
+
+    def clear(self):
+        """
+        Remove all finished elements from the DOM, which is being built.
+        Only the elements which are still opened are kept.
+
+        This can be used to keep the memory usage low, when the big document
+        is parsed by parts.
+        """
+        opened = set(id(opener) for opener, _ in self._openers)
+        self._release(el for el in self._ostack if id(el) not in opened)
+        self._ostack[:] = [opener for opener, _ in self._openers]
+
+        if self.index is not None:
+            self.index.clear()
+            for el in self._ostack:
+                self.index.add(el)
+
+        self._openers[:] = [
+            (opener, index + 1)
+            for index, (opener, _) in enumerate(self._openers)
+        ]
+
+    def close(self):
+        """
+        Convert all unclosed elements to nonpair tags and return the DOM.
+
+        The :attr:`index` of the returned DOM is replaced by new one.
+
+        Returns:
+            list: DOM tree as list.
+        """
+        self._close_unclosed(0)
+
+        ostack = self._ostack
+        self.__init__(
+            self.events,
+            None if self.index is None else DocumentIndex(),
+        )
+
+        return ostack
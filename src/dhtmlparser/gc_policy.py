@@ -0,0 +1,110 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Control of the garbage collector, shared by the parsers running in multiple
+threads.
+
+Parsing creates lots of objects, which are all alive until the end of the
+parse, so the collections triggered during the parse are just wasted time.
+Big DOMs kept in memory for a long time are walked by each full collection,
+which can be avoided by :func:`freeze`.
+"""
+# Imports =====================================================================
+import gc
+import threading
+from contextlib import contextmanager
+
+
+# Variables ===================================================================
+_LOCK = threading.Lock()
+_paused = 0  # number of the parsers, which need the GC to be disabled
+_was_enabled = False  # state of the GC before the first parser paused it
+
+
+# Functions & objects =========================================================
+def _pause():
+    global _paused, _was_enabled
+
+    with _LOCK:
+        if _paused == 0:
+            _was_enabled = gc.isenabled()
+            gc.disable()
+
+        _paused += 1
+
+
+def _resume():
+    global _paused
+
+    with _LOCK:
+        _paused -= 1
+
+        if _paused == 0 and _was_enabled:
+            gc.enable()
+
+
+@contextmanager
+def paused_gc(disable=True):
+    """
+    Disable the garbage collector inside the ``with`` block.
+
+    The GC is enabled again, when the last of the concurrently running blocks
+    is finished, and only if it was enabled before the first one.
+
+    Example::
+
+        >>> with paused_gc():
+        ...     dom = dhtmlparser.parseString(html)
+
+    Args:
+        disable (bool, default True): Set to False to keep the GC running.
+    """
+    if not disable:
+        yield
+        return
+
+    _pause()
+    try:
+        yield
+    finally:
+        _resume()
+
+
+def freeze():
+    """
+    Move all objects tracked by the garbage collector (including the DOMs
+    parsed so far) to the permanent generation, so they are ignored by the
+    future collections. See :func:`gc.freeze`.
+
+    Warning:
+        Frozen objects are never collected, until :func:`unfreeze` is called.
+        DOM contains reference cycles (:attr:`.HTMLElement.endtag` and
+        :attr:`.HTMLElement.openertag`), so use this only for the DOMs kept
+        for the whole life of the process, like cached templates.
+
+    Returns:
+        bool: False, if not supported by the python (older than 3.7).
+    """
+    if not hasattr(gc, "freeze"):
+        return False
+
+    gc.freeze()
+    return True
+
+
+def unfreeze():
+    """
+    Move the objects from the permanent generation back to the oldest one.
+    See :func:`gc.unfreeze`.
+
+    Returns:
+        bool: False, if not supported by the python (older than 3.7).
+    """
+    if not hasattr(gc, "unfreeze"):
+        return False
+
+    gc.unfreeze()
+    return True
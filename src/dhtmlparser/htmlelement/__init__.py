@@ -9,3 +9,9 @@ from .shared import _rotate_buff
 from .shared import _closeElements
 
 from .html_element import HTMLElement
+from .html_element import TextElement
+from .html_element import CommentElement
+from .html_element import EndTagElement
+from .html_element import _createElement
+from .html_element import _createTokenElement
+from .html_matcher import Matcher
@@ -4,13 +4,62 @@
 # Interpreter version: python 2.7
 #
 # Imports =====================================================================
+from ..specialdict import CaseInsensitiveDict
+
+from ..options import DEFAULT_OPTIONS
+
 from .html_query import HTMLQuery
 from .html_parser import _is_iterable
+from .html_parser import _parse_tag_name
+from .html_parser import _tag_keys
+from .html_parser import _TAG
+from .html_parser import _ALL
+from .html_parser import _END_TAG
+from .html_parser import _COMMENT
+from .html_parser import _NONPAIR
+from .html_parser import _CONTAINER
+from .html_parser import _CANONICAL
+from .html_parser import _CACHE_STRING
+from .html_parser import _SOURCE
+from .html_parser import _TRACKED
+from .html_parser import _watch
+from .html_source import _span
+from .html_source import _source_string
 
 
-# Variables ===================================================================
 # Functions & classes =========================================================
+class _ImmutableParams(CaseInsensitiveDict):
+    """
+    Empty :class:`.CaseInsensitiveDict`, which can't be changed. It is
+    shared as :attr:`HTMLElement.params` by all the lightweight elements.
+    """
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Parameters of this element can't be changed!")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+    __ior__ = _readonly
+
+    @property
+    def _owner(self):
+        return None
+
+    @_owner.setter
+    def _owner(self, owner):
+        pass  # shared by many elements and never changed
+
+    def __reduce__(self):
+        return "_EMPTY_PARAMS"  # copies share the module level instance
+
+
 class HTMLElement(HTMLQuery):
+    __slots__ = ()
+
     def __str__(self):
         return self.toString()
 
@@ -23,25 +72,91 @@ class HTMLElement(HTMLQuery):
 
         If you want prettified string, try :meth:`.prettify`.
 
+        Note:
+            If the element was parsed with the
+            :attr:`.ParserOptions.cache_strings`, the output is cached until
+            the element or one of its subelements is changed. With the
+            :attr:`.ParserOptions.keep_source`, the unchanged elements return
+            exactly the parsed string.
+
         Returns:
             str: Complete representation of the element with childs, endtag \
                  and so on.
         """
-        output = ""
+        if self._flags & _SOURCE and not self._flags & _END_TAG and \
+           self._source_pos[0].isValid():
+            return _source_string(self)
+
+        # only the tracked elements know about the changes of the subelements
+        if self._flags & (_CACHE_STRING | _TRACKED) != \
+           _CACHE_STRING | _TRACKED:
+            return "".join(self.iterString())
 
-        if self.childs or self.isOpeningTag():
-            output += self.tagToString()
+        if self._str_cache is None:
+            self._str_cache = "".join(self.iterString())
 
-            for c in self.childs:
-                output += c.toString()
+        return self._str_cache
 
-            if self.endtag is not None:
-                output += self.endtag.tagToString()
+    def iterString(self):
+        """
+        Iterate over the pieces of the :meth:`toString` output, in the
+        document order.
 
-        elif not self.isEndTag():
-            output += self.tagToString()
+        The DOM is walked using explicit stack, so the output of the deeply
+        nested elements doesn't have to be concatenated on each level::
 
-        return output
+            >>> "".join(dom.iterString()) == dom.toString()
+            True
+
+        Yields:
+            str: Pieces of the HTML representation.
+        """
+        # (iterator over the childs, endtag of their parent)
+        stack = [(iter((self,)), None)]
+        while stack:
+            childs, endtag = stack[-1]
+
+            for el in childs:
+                flags = el._flags
+                if flags & _SOURCE and not flags & _END_TAG and \
+                   el._source_pos[0].isValid():
+                    yield _source_string(el)  # unchanged since the parsing
+                    continue
+
+                if flags & _CACHE_STRING and el._str_cache is not None:
+                    yield el._str_cache
+                    continue
+
+                if el._childs or flags & _ALL == _TAG:  # .isOpeningTag()
+                    yield el.tagToString()
+                    stack.append((iter(el._childs), el.endtag))
+                    break  # continue with the childs of the `el`
+
+                if not flags & _END_TAG:
+                    yield el.tagToString()
+            else:
+                stack.pop()
+                if endtag is not None:
+                    yield endtag.tagToString()
+
+    def write(self, fileobj, pretty=False):
+        """
+        Write the :meth:`toString` output to the `fileobj`, piece by piece,
+        without building the whole string in memory::
+
+            >>> with open("out.html", "w") as f:
+            ...     dom.write(f)
+
+        Args:
+            fileobj (obj): Object with ``.write()`` method.
+            pretty (bool, default False): Write the :meth:`prettify` output
+                   instead.
+        """
+        pieces = self.iterPrettify() if pretty else self.iterString()
+
+        write = fileobj.write
+        for piece in pieces:
+            write(piece)
 
     def getContent(self):
         """
@@ -54,16 +169,53 @@ class HTMLElement(HTMLQuery):
         if not self.childs:
             return ""
 
-        output = ""
-        for c in self.childs:
-            if not c.isEndTag():
-                output += c.toString()
+        output = "".join(
+            c.toString()
+            for c in self.childs
+            if not c.isEndTag()
+        )
 
         if output.endswith("\n"):
             return output.rstrip()
 
         return output
 
+    def getSpan(self):
+        """
+        Returns:
+            tuple: ``(start, end)`` offsets of the element (with its childs \
+                   and endtag) in the parsed text, or None, if it was not \
+                   parsed with the :attr:`.ParserOptions.keep_source`.
+        """
+        span = _span(self)
+        if span is None:
+            return None
+
+        return span[1:]
+
+    def getPosition(self):
+        """
+        Position of the element in the parsed text, for the error messages::
+
+            >>> options = dhtmlparser.ParserOptions(keep_source=True)
+            >>> dom = dhtmlparser.parseString("<a>\\n  <b>", options=options)
+            >>> dom.find("b")[0].getPosition()
+            (2, 3)
+
+        Returns:
+            tuple: ``(line, column)``, both starting from ``1``, or None, if \
+                   the element was not parsed with the \
+                   :attr:`.ParserOptions.keep_source`, or its text was \
+                   discarded by the :class:`.IterParser`.
+        """
+        span = _span(self)
+        if span is None:
+            return None
+
+        source, start, _ = span
+
+        return source.lineAndColumn(start)
+
     def prettify(self, depth=0, separator="  ", last=True, pre=False,
                  inline=False):
         """
@@ -76,59 +228,80 @@ class HTMLElement(HTMLQuery):
         Returns:
             str: Prettified string.
         """
-        output = ""
+        return "".join(self.iterPrettify(depth, separator, pre, inline))
 
-        if self.getTagName() != "" and self.tagToString().strip() == "":
-            return ""
+    def iterPrettify(self, depth=0, separator="  ", pre=False, inline=False):
+        """
+        Iterate over the pieces of the :meth:`prettify` output.
+
+        The DOM is walked using explicit stack, so the deeply nested elements
+        don't hit the recursion limit, and the state of each element
+        (indentation, ``<pre>`` and inline content) is computed only once.
 
-        # if not inside <pre> and not inline, shift tag to the right
-        if not pre and not inline:
-            output += (depth * separator)
-
-        # for <pre> set 'pre' flag
-        if self.getTagName().lower() == "pre" and self.isOpeningTag():
-            pre = True
-            separator = ""
-
-        output += self.tagToString()
-
-        # detect if inline - is_inline shows if inline was set by detection, or
-        # as parameter
-        is_inline = inline
-        for c in self.childs:
-            if not (c.isTag() or c.isComment()):
-                if len(c.tagToString().strip()) != 0:
-                    inline = True
-
-        # don't shift if inside container (containers have blank tagname)
-        original_depth = depth
-        if self.getTagName() != "":
-            if not pre and not inline:  # inside <pre> doesn't shift tags
+        Yields:
+            str: Pieces of the prettified string.
+        """
+        # (el, depth, separator, pre, inline) for the elements, or the
+        # strings, which are yielded after the childs of the element
+        stack = [(self, depth, separator, pre, inline)]
+        while stack:
+            item = stack.pop()
+            if item.__class__ is not tuple:
+                yield item
+                continue
+
+            el, depth, separator, pre, inline = item
+
+            output = el.tagToString()
+            is_blank = not output.strip()
+            has_name = el.getTagName() != ""
+
+            if has_name and is_blank:  # whitespace between the tags
+                continue
+
+            # if not inside <pre> and not inline, shift tag to the right
+            if not pre and not inline and depth:
+                output = depth * separator + output
+
+            # for <pre> set 'pre' flag
+            if el._tagkey == "pre" and el.isOpeningTag():
+                pre = True
+                separator = ""
+
+            # detect if inline - is_inline shows if inline was set by
+            # detection, or as parameter
+            is_inline = inline
+            if not inline:
+                for c in el._childs:
+                    if not c._flags & (_TAG | _COMMENT) and c._element.strip():
+                        inline = True
+                        break
+
+            # don't shift if inside container (containers have blank tagname)
+            original_depth = depth
+            if has_name and not pre and not inline:  # <pre> doesn't shift
                 depth += 1
-                if self.tagToString().strip() != "":
+                if not is_blank:
                     output += "\n"
 
-        # prettify childs
-        for e in self.childs:
-            if not e.isEndTag():
-                output += e.prettify(
-                    depth,
-                    last=False,
-                    pre=pre,
-                    inline=inline
-                )
+            yield output
 
-        # endtag
-        if self.endtag is not None:
-            if not pre and not inline:
-                output += ((original_depth) * separator)
+            # endtag
+            if el.endtag is not None:
+                end = el.endtag.tagToString().strip()
+                if not pre and not inline:
+                    end = original_depth * separator + end
 
-            output += self.endtag.tagToString().strip()
+                if not is_inline:
+                    end += "\n"
 
-            if not is_inline:
-                output += "\n"
+                stack.append(end)
 
-        return output
+            # childs always use the default separator
+            childs = el._childs
+            for index in range(len(childs) - 1, -1, -1):
+                if not childs[index]._flags & _END_TAG:
+                    stack.append((childs[index], depth, "  ", pre, inline))
 
     def replaceWith(self, el):
         """
@@ -136,21 +309,44 @@ class HTMLElement(HTMLQuery):
 
         This useful when you don't want change all references to object.
 
+        Note:
+            :attr:`params` are copied, so the changes of one element don't
+            change the other one.
+
         Args:
             el (obj): :class:`HTMLElement` instance.
         """
-        self.childs = el.childs
-        self.params = el.params
+        self._changed()  # before the position of the element is replaced
+
+        # immutable values shared by the lightweight elements are not taken
+        childs = el.childs
+        if childs is _EMPTY_CHILDS:
+            childs = []
+
+        # each element reports the changes of its own params, see _changed()
+        if el._params is _EMPTY_PARAMS:
+            params = CaseInsensitiveDict()
+        else:
+            params = el.params.copy()
+
+        self.childs = childs
+        self._params = params
         self.endtag = el.endtag
         self.openertag = el.openertag
 
         self._tagname = el.getTagName()
+        self._tagkey = el._tagkey
         self._element = el.tagToString()
 
-        self._istag = el.isTag()
-        self._isendtag = el.isEndTag()
-        self._iscomment = el.isComment()
-        self._isnonpairtag = el.isNonPairTag()
+        kept = _CONTAINER | _TRACKED
+        self._flags = (self._flags & kept) | (el._flags & ~kept)
+        self._flags &= ~(_CANONICAL | _SOURCE)  # `_element` isn't the source
+        self._tag_cache = None
+        self._str_cache = None
+        self._source_pos = None
+
+        if self._flags & _TRACKED:
+            _watch(self._params, self)
 
     def removeChild(self, child, end_tag_too=True):
         """
@@ -190,3 +386,147 @@ class HTMLElement(HTMLQuery):
                 self.childs.remove(end_tag)
 
             self.childs.remove(e)
+
+    def markDirty(self):
+        """
+        Record change of this element, which can't be tracked automatically.
+
+        Changes of the :attr:`childs` lists and of the :attr:`params` of the
+        tracked elements (see :meth:`_changed`) are recorded automatically.
+        Call this after the change of the :attr:`endtag`. Recorded changes
+        invalidate the strings cached by the :meth:`toString`, the slicing of
+        the parsed text and the :class:`.DocumentIndex` of this element and
+        its parents.
+
+        Example::
+
+            >>> div.endtag = dhtmlparser.HTMLElement("</section>")
+            >>> div.markDirty()
+        """
+        self._changed()
+
+
+# Variables ===================================================================
+_EMPTY_PARAMS = _ImmutableParams()
+_EMPTY_CHILDS = ()
+
+
+# Lightweight elements ========================================================
+class _LeafElement(HTMLElement):
+    """
+    Base class for the lightweight elements, which are created by the parser
+    for the text, comments and end tags.
+
+    They share immutable empty :attr:`params` and :attr:`childs` and are
+    initialized directly, without the parsing done in the :class:`HTMLElement`
+    constructor. Otherwise, they work same as :class:`HTMLElement`.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def _create(cls, element, tagname, tagkey, flags):
+        el = cls.__new__(cls)
+
+        el._element = element
+        el._tagname = tagname
+        el._tagkey = tagkey
+        el._flags = flags
+
+        el._childs = _EMPTY_CHILDS
+        el._params = _EMPTY_PARAMS
+        el.endtag = None
+        el.openertag = None
+        el._parent = None
+
+        el._tag_cache = None
+        el._str_cache = None
+        el._source_pos = None
+
+        return el
+
+
+class TextElement(_LeafElement):
+    """
+    Text between the tags.
+    """
+    __slots__ = ()
+
+
+class CommentElement(_LeafElement):
+    """
+    HTML comment (``<!-- .. -->``).
+    """
+    __slots__ = ()
+
+
+class EndTagElement(_LeafElement):
+    """
+    End tag without parameters (``</tag>``).
+    """
+    __slots__ = ()
+
+
+def _createElement(token, options=DEFAULT_OPTIONS):
+    """
+    Create element for the `token` from the tokenizer.
+
+    Text, comments and end tags are represented by lightweight
+    :class:`TextElement`, :class:`CommentElement` and :class:`EndTagElement`.
+    Other tokens are parsed same as by :class:`HTMLElement` constructor.
+
+    Args:
+        token (str): Tag, comment or text.
+        options (obj, default DEFAULT_OPTIONS): :class:`.ParserOptions`.
+
+    Returns:
+        obj: :class:`HTMLElement` or one of its subclasses.
+    """
+    if not (token.startswith("<") and token.endswith(">")):
+        return TextElement._create(token, token, None, 0)
+
+    if token.startswith("<!--") and token.endswith("-->"):
+        return CommentElement._create(token, token, None, _TAG | _COMMENT)
+
+    # end tags with parameters are not so lightweight
+    if not token.startswith("</") or "=" in token:
+        return HTMLElement._from_string(token, options)
+
+    tagname, tagkey = _tag_keys(_parse_tag_name(token))
+
+    flags = _TAG | _END_TAG
+    if token.endswith("/>") or tagkey in options.nonpair_tags:
+        flags |= _NONPAIR
+
+    return EndTagElement._create(token, tagname, tagkey, flags)
+
+
+def _createTokenElement(token, flags, tagname, options=DEFAULT_OPTIONS):
+    """
+    Create element for the classified `token` from the :class:`.Tokenizer`.
+
+    Args:
+        token (str): Tag, comment or text.
+        flags (int): Type of the token, or None, if not known.
+        tagname (str): Name of the tag.
+        options (obj, default DEFAULT_OPTIONS): :class:`.ParserOptions`.
+
+    Returns:
+        obj: :class:`HTMLElement` or one of its subclasses.
+    """
+    if flags is None:
+        return _createElement(token, options)
+
+    if not flags & _TAG:
+        return TextElement._create(token, token, None, 0)
+
+    if flags & _COMMENT:
+        return CommentElement._create(token, token, None, flags)
+
+    if not flags & _END_TAG or "=" in token:
+        return HTMLElement._from_token(token, flags, tagname, options)
+
+    tagname, tagkey = _tag_keys(tagname)
+    if tagkey in options.nonpair_tags:
+        flags |= _NONPAIR
+
+    return EndTagElement._create(token, tagname, tagkey, flags)
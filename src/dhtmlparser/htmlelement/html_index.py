@@ -0,0 +1,460 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Index of the elements in the DOM, which is used by the searching methods of
+the document root.
+"""
+# Imports =====================================================================
+import re
+from collections import deque
+
+from .html_parser import _TAG
+from .html_parser import _END_TAG
+from .html_parser import _COMMENT
+
+
+# Variables ===================================================================
+# names of the tags and text, which can be looked up in the index
+_INDEXABLE = re.compile(r"[^\s<]+\Z")
+
+# tags without this in their HTML can't have `id` or `class` parameters -
+# names start behind the whitespace or quote and _parse_params() skips the
+# whitespace inside them, the last one may be without value (and it cuts the
+# last character of the unfinished tags)
+_ID_OR_CLASS = re.compile(
+    r"""[\s"'](?:i\s*d|c\s*l\s*a\s*s\s*s)\s*(?:[=>]|\S?\s*\Z)""",
+    re.IGNORECASE
+)
+
+_NO_CLASSES = frozenset()
+
+
+# Functions & objects =========================================================
+def _index_key(el):
+    """
+    Return key of the `el` in :attr:`DocumentIndex.tags`.
+
+    Text is indexed too, because :meth:`.HTMLQuery.isAlmostEqual` compares
+    the text with the `tag_name` same as the tag names.
+
+    Args:
+        el (obj): :class:`.HTMLElement` instance.
+
+    Returns:
+        str: Lowercased name of the `el`, or None, if it can't be indexed.
+    """
+    key = el._tagkey
+    if key is None:  # text and comments
+        key = el._tagname.lower()
+
+        if key == el._tagname:  # don't keep the copy of the same text
+            key = el._tagname
+
+    if not _INDEXABLE.match(key):
+        return None
+
+    return key
+
+
+def _is_tag(el):
+    """
+    Returns:
+        bool: True for the opening and nonpair tags, False for the end tags, \
+              comments and text.
+    """
+    return el._flags & (_TAG | _END_TAG | _COMMENT) == _TAG
+
+
+def _id_and_classes(el):
+    """
+    Return `id` and `class` parameters of the `el`.
+
+    Parameters of the tags, which can't contain them, are not parsed.
+
+    Args:
+        el (obj): :class:`.HTMLElement` instance.
+
+    Returns:
+        tuple: ``(id, set of class names)``, `id` is None if not set.
+    """
+    if not _is_tag(el):
+        return None, _NO_CLASSES
+
+    params = el._params
+    if params is None:
+        if not _ID_OR_CLASS.search(el._element):
+            return None, _NO_CLASSES
+
+        params = el.params
+
+    class_names = params.get("class")
+
+    if not class_names:
+        return params.get("id"), _NO_CLASSES
+
+    return params.get("id"), frozenset(class_names.split())
+
+
+def _walk(dom):
+    """
+    Iterate over all subelements of the `dom` in the same order as
+    :meth:`.HTMLQuery.findAll` (without the `dom` itself).
+    """
+    stack = list(reversed(dom._childs))
+    while stack:
+        el = stack.pop()
+        yield el
+
+        if el._childs:
+            stack.extend(reversed(el._childs))
+
+
+def _walk_breadth(dom, max_depth=None):
+    """
+    Iterate over all subelements of the `dom` using `Breadth-first algorithm
+    <http://en.wikipedia.org/wiki/Breadth-first_search>`_ (without the `dom`
+    itself). The DOM is not changed.
+
+    Args:
+        dom (obj): :class:`.HTMLElement` instance.
+        max_depth (int, default None): Don't go deeper than this. Direct
+                  childs of the `dom` are in the depth ``1``.
+    """
+    if max_depth is not None and max_depth < 1:
+        return
+
+    queue = deque((el, 1) for el in dom._childs)
+    while queue:
+        el, depth = queue.popleft()
+        yield el
+
+        if el._childs and (max_depth is None or depth < max_depth):
+            depth += 1
+            queue.extend((child, depth) for child in el._childs)
+
+
+class _TreeMap(object):
+    """
+    Positions of the elements in the single linked DOM, which are needed to
+    go from the elements to their parents and siblings.
+
+    The map is filled by :meth:`walk`, so the positions are known for all
+    elements already returned by it and for their siblings.
+
+    Attributes:
+        root (obj): :class:`.HTMLElement` instance, where the map starts.
+        nodes (dict): ``id(el)`` -> ``(parent, index in parent.childs, index
+            among the tags in parent.childs)``.
+        tag_counts (dict): ``id(parent)`` -> number of tags in its childs.
+        order (dict): ``id(el)`` -> position in the document order.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.nodes = {id(root): (None, None, None)}
+        self.tag_counts = {}
+        self.order = {}
+
+    def walk(self):
+        """
+        Iterate over all subelements of the :attr:`root` in the document
+        order (same as :func:`_walk`).
+        """
+        order = self.order
+
+        self._add_childs(self.root)
+        stack = list(reversed(self.root._childs))
+        while stack:
+            el = stack.pop()
+            order[id(el)] = len(order)
+            yield el
+
+            if el._childs:
+                self._add_childs(el)
+                stack.extend(reversed(el._childs))
+
+    def fill(self):
+        """
+        Walk through the whole DOM.
+
+        Returns:
+            obj: This map.
+        """
+        for _ in self.walk():
+            pass
+
+        return self
+
+    def _add_childs(self, parent):
+        nodes = self.nodes
+        tags = 0
+
+        for index, el in enumerate(parent._childs):
+            nodes[id(el)] = (parent, index, tags)
+
+            if _is_tag(el):
+                tags += 1
+
+        self.tag_counts[id(parent)] = tags
+
+    def parent(self, el):
+        """
+        Returns:
+            obj: Parent of the `el` or None for the :attr:`root`.
+        """
+        return self.nodes[id(el)][0]
+
+    def previousTags(self, el):
+        """
+        Iterate over the tags before the `el` in its parent, from the nearest.
+        """
+        parent, index, _ = self.nodes[id(el)]
+        if parent is None:
+            return
+
+        for sibling in reversed(parent._childs[:index]):
+            if _is_tag(sibling):
+                yield sibling
+
+    def tagPosition(self, el):
+        """
+        Returns:
+            tuple: ``(position, count)`` of the `el` among the tags of its \
+                   parent, or ``(None, None)`` for the :attr:`root`.
+        """
+        parent, _, position = self.nodes[id(el)]
+        if parent is None:
+            return None, None
+
+        return position, self.tag_counts[id(parent)]
+
+
+class DocumentIndex(object):
+    """
+    Elements of the DOM grouped by their lowercased names, `id` and class
+    names, in the document order.
+
+    Index is built by the :class:`.DOMBuilder` as a by-product of the DOM
+    construction (see :attr:`.ParserOptions.build_index`) and kept in the
+    document root, where it is used by :meth:`.HTMLQuery.findAll`.
+
+    Changes of the indexed DOM are tracked (see
+    :meth:`.HTMLElement._changed`). Each change of the structure invalidates
+    the index and it is built again by :meth:`fromDOM` at its next use.
+    Changes of the parameters only make the :attr:`ids` and :attr:`classes`
+    collected again.
+
+    Attributes:
+        tags (dict): Lowercased name -> list of the elements.
+        ids (dict): `id` parameter -> list of the elements.
+        classes (dict): Class name -> list of the elements.
+        valid (bool): False, if the DOM was changed after the index was
+            created.
+    """
+    def __init__(self, valid=True):
+        self.tags = {}
+        self.valid = valid
+        self._ids = {}
+        self._classes = {}
+        self._params_dom = None  # set when the `_ids` and `_classes` are old
+        self._tree_map = None
+
+    @classmethod
+    def fromDOM(cls, dom):
+        """
+        Build the index of all subelements of the `dom`.
+
+        Args:
+            dom (obj): :class:`.HTMLElement` instance.
+
+        Returns:
+            obj: :class:`DocumentIndex` instance.
+        """
+        index = cls()
+        for el in _walk(dom):
+            index.add(el)
+
+        return index
+
+    def getTreeMap(self, dom):
+        """
+        Return :class:`_TreeMap` of the indexed `dom`. It is built on the
+        first call.
+
+        Args:
+            dom (obj): The indexed :class:`.HTMLElement` instance.
+
+        Returns:
+            obj: :class:`_TreeMap` instance.
+        """
+        if self._tree_map is None or self._tree_map.root is not dom:
+            self._tree_map = _TreeMap(dom).fill()
+
+        return self._tree_map
+
+    @property
+    def ids(self):
+        if self._params_dom is not None:
+            self._collect_params()
+
+        return self._ids
+
+    @property
+    def classes(self):
+        if self._params_dom is not None:
+            self._collect_params()
+
+        return self._classes
+
+    def _collect_params(self):
+        """
+        Collect the :attr:`ids` and :attr:`classes` of the elements again,
+        after their parameters were changed.
+        """
+        dom = self._params_dom
+        self._params_dom = None
+        self._ids = {}
+        self._classes = {}
+
+        for el in _walk(dom):
+            self._add_params(el)
+
+    def isValid(self):
+        """
+        Returns:
+            bool: False, if the DOM was changed after the index was created.
+        """
+        return self.valid
+
+    def invalidate(self):
+        """
+        Record change of the indexed DOM.
+        """
+        self.valid = False
+        self._tree_map = None
+
+    def invalidateParams(self, dom):
+        """
+        Record change of the parameters of the elements in the indexed `dom`.
+
+        Args:
+            dom (obj): The indexed :class:`.HTMLElement` instance.
+        """
+        self._params_dom = dom
+
+    def add(self, el):
+        """
+        Add `el` to the end of the index.
+
+        Args:
+            el (obj): :class:`.HTMLElement` instance.
+        """
+        self._tree_map = None
+
+        key = _index_key(el)
+        if key is not None:
+            self.tags.setdefault(key, []).append(el)
+
+        if self._params_dom is None:  # old ones are collected again anyway
+            self._add_params(el)
+
+    def _add_params(self, el):
+        element_id, class_names = _id_and_classes(el)
+        if element_id is not None:
+            self._ids.setdefault(element_id, []).append(el)
+
+        for class_name in class_names:
+            self._classes.setdefault(class_name, []).append(el)
+
+    def clear(self):
+        """
+        Remove all elements from the index.
+        """
+        self.tags.clear()
+        self._ids.clear()
+        self._classes.clear()
+        self._tree_map = None
+
+    @staticmethod
+    def _remove_from(same_key, el):
+        """
+        Remove `el` from the `same_key` list, if it is there.
+        """
+        if not same_key:
+            return
+
+        # search from the end, where the recently parsed elements are
+        for index in range(len(same_key) - 1, -1, -1):
+            if same_key[index] is el:
+                del same_key[index]
+                return
+
+    def remove(self, el):
+        """
+        Remove `el` and all its subelements from the index.
+
+        Args:
+            el (obj): :class:`.HTMLElement` instance.
+        """
+        self._tree_map = None
+
+        for sub_el in [el] + list(_walk(el)):
+            self._remove_from(self.tags.get(_index_key(sub_el)), sub_el)
+            if self._params_dom is not None:
+                continue
+
+            element_id, class_names = _id_and_classes(sub_el)
+            self._remove_from(self._ids.get(element_id), sub_el)
+
+            for class_name in class_names:
+                self._remove_from(self._classes.get(class_name), sub_el)
+
+    def candidates(self, tag_name, params=None):
+        """
+        Look up the subelements, which may be matched by the
+        :meth:`.HTMLQuery.findAll`.
+
+        Elements are looked up by the `id` from the `params`, or by the
+        `tag_name`.
+
+        Returns:
+            list: Elements in the document order, or None, if the `tag_name` \
+                  and `params` can't be looked up in the index.
+        """
+        if params and "id" in params.keys():
+            try:
+                return self.ids.get(params["id"], ())
+            except TypeError:  # unhashable value
+                pass
+
+        if not tag_name:
+            return None
+
+        key = tag_name.lower()
+        if not _INDEXABLE.match(key):
+            return None
+
+        return self.tags.get(key, ())
+
+    def __reduce__(self):
+        # copies are invalid, because the changes of the originals are not
+        # tracked in the other processes
+        return (self.__class__, (False,))
+
+
+def _has_id(el, element_id):
+    """
+    Returns:
+        bool: True if the `el` is tag with `element_id` in the `id` parameter.
+    """
+    return _id_and_classes(el)[0] == element_id
+
+
+def _has_classes(el, class_names):
+    """
+    Returns:
+        bool: True if the `el` is tag with all the `class_names`.
+    """
+    return _id_and_classes(el)[1] >= class_names
@@ -0,0 +1,294 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Precompiled queries for the :meth:`.HTMLQuery.find` and related methods.
+"""
+# Imports =====================================================================
+import re
+
+from .html_parser import HTMLParser
+from .html_parser import _is_str
+
+
+# Variables ===================================================================
+_REGEX_TYPE = type(re.compile(""))
+
+
+# Functions & objects =========================================================
+def _full_match_regex(pattern, case_sensitive):
+    """
+    Return copy of the `pattern`, which matches only whole strings.
+    """
+    flags = pattern.flags
+    if not case_sensitive:
+        flags |= re.IGNORECASE
+
+    return re.compile(r"(?:%s)\Z" % pattern.pattern, flags)
+
+
+class Matcher(object):
+    """
+    Query compiled once, so testing the elements is as cheap as possible.
+
+    All the searching methods compile their arguments to the :class:`Matcher`,
+    but you can also use it directly as `tag_name` in :meth:`.HTMLQuery.find`,
+    :meth:`.HTMLQuery.findAll`, :meth:`.HTMLQuery.wfind`,
+    :meth:`.HTMLQuery.match` and similar methods, to reuse it, or to use
+    the regular expressions and sets of names::
+
+        >>> pdf_links = Matcher("a", {"href": re.compile(r"\\.pdf$")})
+        >>> headings = Matcher(re.compile(r"h[1-6]"))
+        >>> cells = Matcher({"td", "th"})
+        >>> dom.find(pdf_links)
+        [HTMLElement('<a href="x.pdf">')]
+
+    Args:
+        tag_name (str/set/regex, default None): Name of the tag, set of the
+                 names, or compiled regular expression, which has to match
+                 whole name. Name of the text and comments is their content,
+                 same as in :meth:`.HTMLQuery.isAlmostEqual`. Blank string or
+                 None match all elements.
+        params (dict, default None): Parameters which have to be present in
+               tag to be considered matching. Values may be compiled regular
+               expressions, which have to be found in the parameter
+               (:meth:`re.search`).
+        fn (function, default None): Function, which has to return True for
+           the matching elements. It is called only for the elements with
+           matching name.
+        case_sensitive (bool, default False): Use case sensitive matching of
+                       the `tag_name`.
+    """
+    __slots__ = (
+        "tag_name",
+        "params",
+        "fn",
+        "case_sensitive",
+        "_key",
+        "_names",
+        "_regex",
+        "_param_tests",
+        "_has_regex",
+    )
+
+    def __init__(self, tag_name=None, params=None, fn=None,
+                 case_sensitive=False):
+        if isinstance(tag_name, HTMLParser):  # same as in .isAlmostEqual()
+            params = tag_name.params if tag_name.params else None
+            tag_name = tag_name.getTagName()
+            fn = None
+            case_sensitive = False
+
+        self.tag_name = tag_name
+        self.params = params
+        self.fn = fn
+        self.case_sensitive = case_sensitive
+
+        self._key = None  # name for the plain comparison
+        self._names = None  # set of names
+        self._regex = None
+        self._has_regex = False
+
+        if not tag_name:
+            pass
+        elif isinstance(tag_name, _REGEX_TYPE):
+            self._regex = _full_match_regex(tag_name, case_sensitive)
+        elif _is_str(tag_name):
+            self._key = tag_name if case_sensitive else tag_name.lower()
+        else:
+            self._names = frozenset(
+                name if case_sensitive else name.lower()
+                for name in tag_name
+            )
+
+        self._param_tests = None
+        if params is not None:
+            self._param_tests = []
+            for key, value in params.items():
+                is_regex = isinstance(value, _REGEX_TYPE)
+                self._has_regex = self._has_regex or is_regex
+
+                self._param_tests.append((key, value, is_regex))
+
+    def _name_of(self, el):
+        """
+        Return name of the `el` in the form used by the `tag_name`.
+        """
+        if self.case_sensitive:
+            return el._tagname
+
+        if el._tagkey is None:  # text and comments
+            return el._tagname.lower()
+
+        return el._tagkey
+
+    def matches(self, el):
+        """
+        Args:
+            el (obj): :class:`.HTMLElement` instance.
+
+        Returns:
+            bool: True if the `el` matches this query.
+        """
+        key = self._key
+        if key is not None:
+            if self.case_sensitive:
+                if el._tagname != key:
+                    return False
+
+            elif el._tagkey is not None:
+                if el._tagkey != key:
+                    return False
+
+            # .lower() never makes the text shorter
+            elif len(el._tagname) > len(key) or el._tagname.lower() != key:
+                return False
+
+        elif self._names is not None:
+            if self._name_of(el) not in self._names:
+                return False
+
+        elif self._regex is not None:
+            if not self._regex.match(el._tagname):
+                return False
+
+        if self.fn is not None and not self.fn(el):
+            return False
+
+        if self._param_tests is None:
+            return True
+
+        return self._matchesParams(el.params)
+
+    __call__ = matches
+
+    def _matchesParams(self, own_params):
+        for key, value, is_regex in self._param_tests:
+            if key not in own_params:
+                break
+
+            if is_regex:
+                actual = own_params[key]
+                if not _is_str(actual) or not value.search(actual):
+                    return False
+
+            elif own_params[key] != value:
+                break
+        else:
+            return True
+
+        # same as the comparison of the whole params in .isAlmostEqual(),
+        # which may differ for the case insensitive `params`
+        return not self._has_regex and \
+            len(own_params) == len(self.params) and \
+            self.params == own_params
+
+    def candidates(self, index):
+        """
+        Look up the elements, which may be matched, in the `index`.
+
+        Args:
+            index (obj): :class:`.DocumentIndex` instance.
+
+        Returns:
+            list: Elements in the document order, or None, if they can't be \
+                  looked up in the index.
+        """
+        tag_name = self.tag_name if self._key is not None else None
+        params = self.params if not self._has_regex else None
+
+        return index.candidates(tag_name, params)
+
+    def __repr__(self):
+        return "Matcher(%r, %r, %r, %r)" % (
+            self.tag_name,
+            self.params,
+            self.fn,
+            self.case_sensitive,
+        )
+
+
+def _compile_query(tag_name, params=None, fn=None, case_sensitive=False):
+    """
+    Return :class:`Matcher` for the arguments of the searching methods.
+
+    Returns:
+        obj: `tag_name`, if it is already :class:`Matcher`.
+    """
+    if isinstance(tag_name, Matcher):
+        return tag_name
+
+    return Matcher(tag_name, params, fn, case_sensitive)
+
+
+def _match_children(level, matchers):
+    """
+    Match the `matchers` as the path of direct childs, starting at the `level`
+    list of elements.
+
+    Returns:
+        list: Elements matched by the last of the `matchers`.
+    """
+    for position, matcher in enumerate(matchers):
+        matching = [
+            el for el in level
+            if not el.isEndTag() and matcher.matches(el)
+        ]
+
+        if not matching or position == len(matchers) - 1:
+            return matching
+
+        level = [child for el in matching for child in el._childs]
+        if not level:
+            return []
+
+    return []
+
+
+def _match_descendants(dom, matchers):
+    """
+    Match the `matchers` as the path of descendants, each of them searched
+    in the elements matched by the previous one (including them), starting at
+    the `dom` itself.
+
+    The DOM is walked only once. Each element carries the partial matches of
+    its ancestors - tuples with the document positions of the elements
+    matched by the first matchers.
+
+    Returns:
+        list: Elements matched by the last of the `matchers`, once for each \
+              path leading to them, grouped by the elements earlier in the \
+              path.
+    """
+    last = len(matchers)
+    found = []  # (positions of the whole path, el)
+
+    position = 0
+    stack = [(dom, ((),))]
+    while stack:
+        el, paths = stack.pop()
+        position += 1
+
+        if not el.isEndTag():
+            extended = []
+            for path in paths:
+                # the element may match several subsequent matchers
+                while matchers[len(path)].matches(el):
+                    path += (position,)
+                    if len(path) == last:
+                        found.append((path, el))
+                        break
+
+                    extended.append(path)
+
+            if extended:
+                paths += tuple(extended)
+
+        if el._childs:
+            stack.extend((child, paths) for child in reversed(el._childs))
+
+    found.sort(key=lambda item: item[0])
+
+    return [el for _, el in found]
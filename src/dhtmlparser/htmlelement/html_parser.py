@@ -7,14 +7,69 @@
 HTMLElement class used in DOM representation.
 """
 # Imports =====================================================================
+import re
+
+try:
+    from sys import intern as _builtin_intern
+except ImportError:  # python 2
+    from __builtin__ import intern as _builtin_intern
+
 from ..quoter import escape, unescape
-from ..specialdict import SpecialDict
+from ..options import DEFAULT_OPTIONS
+from ..specialdict import CaseInsensitiveDict
+from ..specialdict import _TrackedDict
 
 from .shared import NONPAIR_TAGS
 from .shared import _rotate_buff
 from .shared import _closeElements
 
 
+# Variables ===================================================================
+# bits of the HTMLParser._flags
+_TAG = 1
+_END_TAG = 2
+_COMMENT = 4
+_NONPAIR = 8
+_CONTAINER = 16  # used by .wfind()
+_DICT_PARAMS = 32  # params are stored in plain dict (case sensitive)
+_TRACKED = 64  # changes are reported to the parents, see ._changed()
+_CANONICAL = 128  # unparsed _element is known to be in the canonical form
+_CACHE_STRING = 256  # cache the .toString() output, see ParserOptions
+_SOURCE = 512  # unchanged since the parsing, sliced from the SourceText
+
+_ALL = _TAG | _END_TAG | _COMMENT | _NONPAIR
+
+# slots stored by the HTMLParser.__getstate__()
+_STATE_SLOTS = (
+    "_element",
+    "_tagname",
+    "_tagkey",
+    "_flags",
+    "_childs",
+    "_params",
+    "endtag",
+    "openertag",
+    "parent",
+    "_source_pos",
+)
+
+# `/` parameter, which makes the tag nonpair (see _parse_params())
+_SLASH_PARAM = re.compile(r"/\s*(?:=|>\Z)")
+
+# tag in the same form as returned by .tagToString(), if the values don't
+# contain quotes and backslashes
+_CANONICAL_TAG = re.compile(
+    r'<([^\s"=/<>]+)((?: ([^\s"=]+)="[^"\\]*")*)(>| />)\Z'
+)
+_CANONICAL_PARAM = re.compile(r' ([^\s"=]+)="')
+
+_TAG_KEYS = {}  # tag name -> (interned tag name, interned lowercased name)
+_TAG_KEYS_LIMIT = 10000
+
+# types of the params, which report their changes, see _watch()
+_WATCHED_PARAMS = (CaseInsensitiveDict, _TrackedDict)
+
+
 # Functions & objects =========================================================
 # helper functions
 def _is_str(tag):
@@ -24,12 +79,48 @@ def _is_str(tag):
         return isinstance(tag, str)
 
 
+def _intern(string):
+    """
+    Return interned version of the `string`, so the same names share one
+    object.
+    """
+    try:
+        return _builtin_intern(string)
+    except TypeError:  # unicode can't be interned in python 2
+        return string
+
+
+def _tag_keys(tag_name):
+    """
+    Get interned `tag_name` and its lowercased version, which is used for the
+    case insensitive comparison of the tags.
+
+    Args:
+        tag_name (str): Name of the tag.
+
+    Returns:
+        tuple: ``(tag_name, lowercased tag_name)``.
+    """
+    keys = _TAG_KEYS.get(tag_name)
+    if keys is not None:
+        return keys
+
+    # don't let the cache grow without limits on the garbage input
+    if len(_TAG_KEYS) >= _TAG_KEYS_LIMIT:
+        _TAG_KEYS.clear()
+
+    keys = (_intern(tag_name), _intern(tag_name.lower()))
+    _TAG_KEYS[keys[0]] = keys
+
+    return keys
+
+
 def _is_dict(tag):
     return isinstance(tag, dict)
 
 
 def _is_iterable(container):
-    return type(container) in [list, tuple]
+    return type(container) in [list, tuple, _ChildList]
 
 
 def _all_html_elements(container):
@@ -39,32 +130,322 @@ def _all_html_elements(container):
     return all(map(lambda x: isinstance(x, HTMLParser), container))
 
 
+def _parse_tag_name(element):
+    """
+    Parse name of the tag from its string representation.
+
+    Args:
+        element (str): HTML tag as string.
+
+    Returns:
+        str: Name of the tag or blank string.
+    """
+    for el in element.split():
+        el = el.replace("/", "").replace("<", "").replace(">", "")
+
+        if el.strip():
+            return el.rstrip()
+
+    return ""
+
+
+def _parse_params(element, tag_name, params):
+    """
+    Parse parameters from their string HTML representation to dictionary.
+
+    Args:
+        element (str): HTML tag as string.
+        tag_name (str): Name of the tag.
+        params (dict): Dictionary to which the parameters are saved.
+
+    Returns:
+        bool: True if the tag is closed by ``/`` in parameters (nonpair).
+    """
+    # check if there are any parameters
+    if " " not in element or "=" not in element:
+        return False
+
+    # remove '<' & '>'
+    raw_params = element.strip()[1:-1].strip()
+
+    # remove tagname
+    offset = raw_params.find(tag_name) + len(tag_name)
+    raw_params = raw_params[offset:].strip()
+
+    # parser machine
+    next_state = 0
+    key = ""
+    value = ""
+    end_quote = ""
+    buff = ["", ""]
+    for c in raw_params:
+        if next_state == 0:      # key
+            if c.strip() != "":  # safer than list space, tab and all
+                if c == "=":     # possible whitespaces in UTF
+                    next_state = 1
+                else:
+                    key += c
+
+        elif next_state == 1:    # value decisioner
+            if c.strip() != "":  # skip whitespaces
+                if c == "'" or c == '"':
+                    next_state = 3
+                    end_quote = c
+                else:
+                    next_state = 2
+                    value += c
+
+        elif next_state == 2:    # one word parameter without quotes
+            if c.strip() == "":
+                next_state = 0
+                params[_intern(key)] = value
+                key = ""
+                value = ""
+            else:
+                value += c
+
+        elif next_state == 3:    # quoted string
+            if c == end_quote and (buff[0] != "\\" or (buff[0]) == "\\" and buff[1] == "\\"):
+                next_state = 0
+                params[_intern(key)] = unescape(value, end_quote)
+                key = ""
+                value = ""
+                end_quote = ""
+            else:
+                value += c
+
+        buff = _rotate_buff(buff)
+        buff[0] = c
+
+    if key:
+        key = _intern(key)
+        if end_quote and value.strip():
+            params[key] = unescape(value, end_quote)
+        else:
+            params[key] = value
+
+    if "/" in params.keys():
+        del params["/"]
+        return True
+
+    return False
+
+
+def _watch(params, el):
+    """
+    Let the `params` report their changes to the `el`, if they can.
+    """
+    if isinstance(params, _WATCHED_PARAMS):
+        params._owner = el
+
+
+def _track(el):
+    """
+    Start tracking the changes of the `el` and all its subelements, so they
+    are reported to their parents (see :meth:`HTMLParser._changed`).
+
+    Args:
+        el (obj): :class:`HTMLParser` instance.
+    """
+    stack = [el]
+    while stack:
+        el = stack.pop()
+        el._flags |= _TRACKED
+        _watch(el._params, el)
+
+        childs = el._childs
+        if childs.__class__ is list:  # tuples of the leaf elements stay
+            childs = el._childs = _ChildList(childs, el)
+        elif childs.__class__ is _ChildList:
+            childs._owner = el
+
+        for child in childs:
+            child._parent = el
+            if not child._flags & _TRACKED:
+                stack.append(child)
+
+
+def _adopt(childs, parent):
+    """
+    Set the `parent` of the `childs`, which were added to its
+    :attr:`HTMLParser.childs`, and track their changes.
+    """
+    for child in childs:
+        if not isinstance(child, HTMLParser):
+            continue
+
+        child._parent = parent
+        if not child._flags & _TRACKED:
+            _track(child)
+
+
+def _release(childs, parent):
+    """
+    Forget the `parent` of the `childs` removed from its
+    :attr:`HTMLParser.childs`.
+    """
+    for child in childs:
+        if getattr(child, "_parent", None) is parent:
+            child._parent = None
+
+
+class _ChildList(list):
+    """
+    List of the :attr:`HTMLParser.childs` of the tracked element, which
+    reports all its changes to the :attr:`_owner` element.
+    """
+    __slots__ = ("_owner",)
+
+    def __init__(self, childs=(), owner=None):
+        list.__init__(self, childs)
+        self._owner = owner
+
+    def _changed(self, added=(), removed=()):
+        owner = self._owner
+        if owner is None:
+            return
+
+        _release(removed, owner)
+        _adopt(added, owner)
+        owner._changed()
+
+    def append(self, child):
+        list.append(self, child)
+        self._changed(added=(child,))
+
+    def extend(self, childs):
+        childs = list(childs)
+        list.extend(self, childs)
+        self._changed(added=childs)
+
+    def __iadd__(self, childs):
+        self.extend(childs)
+        return self
+
+    def insert(self, index, child):
+        list.insert(self, index, child)
+        self._changed(added=(child,))
+
+    def remove(self, child):
+        list.remove(self, child)
+        self._changed(removed=(child,))
+
+    def pop(self, *args):
+        child = list.pop(self, *args)
+        self._changed(removed=(child,))
+
+        return child
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            removed = self[index]
+            value = list(value)
+        else:
+            removed = [self[index]]
+            value = [value]
+            index = slice(index, index + 1 or None)
+
+        list.__setitem__(self, index, value)
+        self._changed(added=value, removed=removed)
+
+    def __delitem__(self, index):
+        removed = self[index]
+        if not isinstance(index, slice):
+            removed = [removed]
+
+        list.__delitem__(self, index)
+        self._changed(removed=removed)
+
+    def __imul__(self, count):
+        removed = list(self) if count < 1 else ()
+        list.__imul__(self, count)
+        self._changed(removed=removed)
+
+        return self
+
+    def clear(self):
+        removed = list(self)
+        list.__delitem__(self, slice(None))
+        self._changed(removed=removed)
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        list.reverse(self)
+        self._changed()
+
+    # python 2 uses these for the simple slices
+    def __setslice__(self, start, end, value):
+        self.__setitem__(slice(start, end), value)
+
+    def __delslice__(self, start, end):
+        self.__delitem__(slice(start, end))
+
+    def __reduce__(self):
+        # the owner is set again by the HTMLParser.__setstate__()
+        return self.__class__, (list(self),)
+
+
 class HTMLParser(object):
     """
     This class is used to represent single linked DOM (see
     :func:`.makeDoubleLinked` for double linked).
 
+    Attributes are stored in ``__slots__`` and the boolean properties of the
+    element are packed to the single integer (:attr:`_flags`), to keep the
+    memory footprint of the big DOMs low. Custom attributes can be still set,
+    they are stored in the ``__dict__``, which is created on the first use.
+
+    Parameters of the tag are parsed from the raw string when the
+    :attr:`params` are used for the first time.
+
+    Changes of the elements are tracked, if they were parsed with the
+    :attr:`.ParserOptions.cache_strings`, :attr:`.ParserOptions.build_index`
+    or :attr:`.ParserOptions.keep_source`. They are reported to the parents
+    (see :meth:`_changed`).
+
     Attributes:
         childs (list): List of child nodes.
-        params (dict): :class:`.SpecialDict` instance holding tag parameters.
+        params (dict): :class:`.CaseInsensitiveDict` instance holding tag
+               parameters.
         endtag (obj): Reference to the ending :class:`HTMLElement` or ``None``.
         openertag (obj): Reference to the openning :class:`HTMLElement` or
                          ``None``.
     """
+    __slots__ = (
+        "_element",
+        "_tagname",
+        "_tagkey",
+        "_flags",
+        "_childs",
+        "_params",
+        "endtag",
+        "openertag",
+        "parent",
+        "_parent",
+        "_tag_cache",
+        "_str_cache",
+        "_source_pos",
+        "__dict__",
+    )
+
     def __init__(self, tag="", second=None, third=None):
         self._element = None
         self._tagname = ""
+        self._tagkey = ""  # lowercased _tagname, None for text and comments
+        self._flags = 0
 
-        self._istag = False
-        self._isendtag = False
-        self._iscomment = False
-        self._isnonpairtag = False
-        self._container = False  # used by .wfind()
-
-        self.childs = []
-        self.params = SpecialDict()
+        self._childs = []
+        self._params = None  # parsed on first access, see .params
         self.endtag = None
         self.openertag = None
+        self._parent = None  # set only for the tracked elements
+
+        self._tag_cache = None  # (params, their version, .tagToString())
+        self._str_cache = None  # .toString() output, see ._changed()
+        self._source_pos = None  # (SourceText, offset)
 
         # blah, constructor overloading in python sux :P
         if _is_str(tag) and not any([second, third]):
@@ -84,6 +465,7 @@ class HTMLParser(object):
             self._init_tag_params(tag, second)
             self.childs = _closeElements(third, self.__class__)
             self.endtag = self.__class__("</" + self.getTagName() + ">")
+            self.endtag.openertag = self
 
         elif _is_str(tag) and _all_html_elements(second):
             # containers with childs are automatically considered as tags
@@ -96,6 +478,7 @@ class HTMLParser(object):
             self._init_tag(tag)
             self.childs = _closeElements(second, self.__class__)
             self.endtag = self.__class__("</" + self.getTagName() + ">")
+            self.endtag.openertag = self
 
         elif _all_html_elements(tag):
             self._init_tag("")
@@ -107,7 +490,7 @@ class HTMLParser(object):
     # =========================================================================
     # = Constructor overloading ===============================================
     # =========================================================================
-    def _init_tag(self, tag):
+    def _init_tag(self, tag, options=None):
         """
         True constructor, which really initializes the :class:`HTMLElement`.
 
@@ -115,26 +498,98 @@ class HTMLParser(object):
 
         Args:
             tag (str): HTML tag as string.
+            options (obj, default None): :class:`.ParserOptions` instance.
+                    :attr:`.DEFAULT_OPTIONS` are used if not set.
         """
+        if options is None:
+            options = DEFAULT_OPTIONS
+
         self._element = tag
+        self._setFlag(_DICT_PARAMS, not options.cip)
+        self._setFlag(_CACHE_STRING, options.cache_strings)
 
         self._parseIsTag()
         self._parseIsComment()
 
-        if not self._istag or self._iscomment:
+        if self._flags & _COMMENT or not self._flags & _TAG:
             self._tagname = self._element
-        else:
-            self._parseTagName()
-
-        if self._iscomment or not self._istag:
+            self._tagkey = None
             return
 
+        self._tagname, self._tagkey = "", ""
+        self._parseTagName()
         self._parseIsEndTag()
-        self._parseIsNonPairTag()
+        self._parseIsNonPairTag(options.nonpair_tags)
 
-        if self._istag and (not self._isendtag) or "=" in self._element:
+        # `/` parameter changes the type of the tag, so it can't be lazy
+        if not self._flags & _NONPAIR and _SLASH_PARAM.search(tag):
             self._parseParams()
 
+    @classmethod
+    def _from_string(cls, tag, options):
+        """
+        Constructor used by the parser, for the tags not classified by the
+        :class:`.Tokenizer`.
+
+        Args:
+            tag (str): HTML tag as string.
+            options (obj): :class:`.ParserOptions` instance.
+
+        Returns:
+            obj: Initialized element.
+        """
+        el = cls()
+        el._init_tag(tag, options)
+
+        return el
+
+    @classmethod
+    def _from_token(cls, tag, flags, tagname, options):
+        """
+        Fast constructor used by the parser, for the tags already classified
+        by the :class:`.Tokenizer`. The `tag` is not scanned again.
+
+        Args:
+            tag (str): HTML tag as string.
+            flags (int): ``_TAG``, ``_END_TAG`` and ``_NONPAIR`` (for tags
+                  ending with ``/>``) bits.
+            tagname (str): Name of the tag.
+            options (obj): :class:`.ParserOptions` instance.
+
+        Returns:
+            obj: Initialized element.
+        """
+        el = cls.__new__(cls)
+
+        el._element = tag
+        el._tagname, el._tagkey = _tag_keys(tagname)
+
+        el._childs = []
+        el._params = None
+        el.endtag = None
+        el.openertag = None
+        el._parent = None
+
+        el._tag_cache = None
+        el._str_cache = None
+        el._source_pos = None
+
+        if el._tagkey in options.nonpair_tags:
+            flags |= _NONPAIR
+
+        if not options.cip:
+            flags |= _DICT_PARAMS
+        if options.cache_strings:
+            flags |= _CACHE_STRING
+
+        el._flags = flags
+
+        # see ._init_tag()
+        if not flags & _NONPAIR and _SLASH_PARAM.search(tag):
+            el._parseParams()
+
+        return el
+
     def _init_tag_params(self, tag, params):
         """
         Alternative constructor used when the tag parameters are added to the
@@ -148,59 +603,122 @@ class HTMLParser(object):
             params (dict): HTML tag parameters as dictionary.
         """
         self._element = tag
-        self.params = params
+        self._params = params
         self._parseTagName()
-        self._istag = True
-        self._isendtag = False
-        self._isnonpairtag = False
+        self._flags = _TAG
 
         self._element = self.tagToString()
 
+    def __getstate__(self):
+        """
+        Values of the slots and of the custom attributes, used by the
+        :mod:`pickle` (python 2 can't pickle the slots by itself).
+
+        Cached strings are not stored. Parent of the element isn't stored
+        either, so the pickled subelement doesn't pull the rest of the DOM in.
+        """
+        state = dict(self.__dict__)
+        for name in _STATE_SLOTS:
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:  # not set yet
+                pass
+
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+        self._tag_cache = None
+        self._str_cache = None
+        if not hasattr(self, "_parent"):  # may be set by the parent already
+            self._parent = None
+
+        if not self._flags & _TRACKED:
+            return
+
+        # copies made by copy.copy() share the childs and params with the
+        # original, so only the new ones are taken over
+        childs = self._childs
+        if childs.__class__ is _ChildList and childs._owner is None:
+            childs._owner = self
+
+            for child in childs:
+                if getattr(child, "_parent", None) is None:
+                    child._parent = self
+
+        if getattr(self._params, "_owner", self) is None:
+            _watch(self._params, self)
+
     # =========================================================================
     # = Parsers ===============================================================
     # =========================================================================
+    def _setFlag(self, flag, value):
+        """
+        Set or clear the `flag` bit in the :attr:`_flags`.
+
+        Args:
+            flag (int): One of the ``_TAG``, ``_END_TAG``, ``_COMMENT``,
+                 ``_NONPAIR`` or ``_CONTAINER`` constants.
+            value (bool): Set the bit if True, clear it otherwise.
+        """
+        # the flags may change the output of .tagToString()
+        self._flags &= ~_CANONICAL
+        self._tag_cache = None
+
+        if value:
+            self._flags |= flag
+        else:
+            self._flags &= ~flag
+
     def _parseIsTag(self):
         """
         Detect whether the element is HTML tag or not.
 
-        Result is saved to the :attr:`_istag` property.
+        Result is saved to the ``_TAG`` bit of :attr:`_flags`.
         """
         el = self._element
-        self._istag = el and el[0] == "<" and el[-1] == ">"
+        self._setFlag(_TAG, el and el[0] == "<" and el[-1] == ">")
 
     def _parseIsEndTag(self):
         """
         Detect whether the element is `endtag` or not.
 
-        Result is saved to the :attr:`_isendtag` property.
+        Result is saved to the ``_END_TAG`` bit of :attr:`_flags`.
         """
-        self._isendtag = self._element.startswith("</")
+        self._setFlag(_END_TAG, self._element.startswith("</"))
 
-    def _parseIsNonPairTag(self):
+    def _parseIsNonPairTag(self, nonpair_tags=NONPAIR_TAGS):
         """
         Detect whether the element is nonpair or not (ends with ``/>``).
 
-        Result is saved to the :attr:`_isnonpairtag` property.
+        Result is saved to the ``_NONPAIR`` bit of :attr:`_flags`.
+
+        Args:
+            nonpair_tags (list, default NONPAIR_TAGS): Names of the tags,
+                         which are always nonpair.
         """
-        self._isnonpairtag = False
+        nonpair = False
 
-        if self._iscomment:
-            return
+        if not self._flags & _COMMENT:
+            if self._element.startswith("<") and self._element.endswith("/>"):
+                nonpair = True
 
-        if self._element.startswith("<") and self._element.endswith("/>"):
-            self._isnonpairtag = True
+            # check listed nonpair tags
+            if self._flags & _TAG and self._tagkey in nonpair_tags:
+                nonpair = True
 
-        # check listed nonpair tags
-        if self._istag and self._tagname.lower() in NONPAIR_TAGS:
-            self._isnonpairtag = True
+        self._setFlag(_NONPAIR, nonpair)
 
     def _parseIsComment(self):
         """
         Detect whether the element is HTML comment or not.
 
-        Result is saved to the :attr:`_iscomment` property.
+        Result is saved to the ``_COMMENT`` bit of :attr:`_flags`.
         """
-        self._iscomment = (
+        self._setFlag(
+            _COMMENT,
             self._element.startswith("<!--") and self._element.endswith("-->")
         )
 
@@ -208,105 +726,160 @@ class HTMLParser(object):
         """
         Parse name of the tag.
 
-        Result is saved to the :attr:`_tagname` property.
+        Result is saved to the :attr:`_tagname` property and its lowercased
+        version to :attr:`_tagkey`.
         """
-        for el in self._element.split():
-            el = el.replace("/", "").replace("<", "").replace(">", "")
+        tagname = _parse_tag_name(self._element)
 
-            if el.strip():
-                self._tagname = el.rstrip()
-                return
+        if tagname:
+            self._tagname, self._tagkey = _tag_keys(tagname)
 
     def _parseParams(self):
         """
         Parse parameters from their string HTML representation to dictionary.
 
         Result is saved to the :attr:`params` property.
-        """
-        # check if there are any parameters
-        if " " not in self._element or "=" not in self._element:
-            return
 
-        # remove '<' & '>'
-        params = self._element.strip()[1:-1].strip()
-
-        # remove tagname
-        offset = params.find(self.getTagName()) + len(self.getTagName())
-        params = params[offset:].strip()
-
-        # parser machine
-        next_state = 0
-        key = ""
-        value = ""
-        end_quote = ""
-        buff = ["", ""]
-        for c in params:
-            if next_state == 0:      # key
-                if c.strip() != "":  # safer than list space, tab and all
-                    if c == "=":     # possible whitespaces in UTF
-                        next_state = 1
-                    else:
-                        key += c
-
-            elif next_state == 1:    # value decisioner
-                if c.strip() != "":  # skip whitespaces
-                    if c == "'" or c == '"':
-                        next_state = 3
-                        end_quote = c
-                    else:
-                        next_state = 2
-                        value += c
-
-            elif next_state == 2:    # one word parameter without quotes
-                if c.strip() == "":
-                    next_state = 0
-                    self.params[key] = value
-                    key = ""
-                    value = ""
-                else:
-                    value += c
+        Returns:
+            bool: True if the tag is closed by ``/`` in parameters (nonpair).
+        """
+        tracked = self._flags & _TRACKED
+        if not self._flags & _DICT_PARAMS:
+            self._params = CaseInsensitiveDict()
+        elif tracked:
+            self._params = _TrackedDict()
+        else:
+            self._params = {}
 
-            elif next_state == 3:    # quoted string
-                if c == end_quote and (buff[0] != "\\" or (buff[0]) == "\\" and buff[1] == "\\"):
-                    next_state = 0
-                    self.params[key] = unescape(value, end_quote)
-                    key = ""
-                    value = ""
-                    end_quote = ""
-                else:
-                    value += c
+        if not self._flags & _TAG or self._flags & _COMMENT:
+            nonpair = False
+        elif self._flags & _END_TAG and "=" not in self._element:
+            nonpair = False
+        else:
+            nonpair = _parse_params(
+                self._element,
+                self.getTagName(),
+                self._params
+            )
 
-            buff = _rotate_buff(buff)
-            buff[0] = c
+        if nonpair:
+            self._flags |= _NONPAIR
 
-        if key:
-            if end_quote and value.strip():
-                self.params[key] = unescape(value, end_quote)
-            else:
-                self.params[key] = value
+        if tracked:
+            self._params._owner = self
 
-        if "/" in self.params.keys():
-            del self.params["/"]
-            self._isnonpairtag = True
+        return nonpair
 
     # * /Parsers **************************************************************
 
     # =========================================================================
     # = Getters ===============================================================
     # =========================================================================
+    @property
+    def params(self):
+        """
+        Parameters of the tag, parsed from the HTML on the first access.
+
+        Returns:
+            dict: :class:`.CaseInsensitiveDict` (or plain ``dict`` for \
+                  ``cip=False``).
+        """
+        params = self._params
+        if params is None:
+            self._parseParams()
+            return self._params
+
+        # changes of the other types can't be watched, they may be done now
+        if self._flags & _TRACKED and not isinstance(params, _WATCHED_PARAMS):
+            self._changed(True)
+
+        return params
+
+    @params.setter
+    def params(self, params):
+        self._params = params
+        self._tag_cache = None
+
+        if self._flags & _TRACKED:
+            _watch(params, self)
+
+        self._changed(True)
+
+    @property
+    def childs(self):
+        """
+        List of the subelements.
+
+        Lists assigned to the tracked elements are copied to the list, which
+        reports its changes (see :meth:`_changed`).
+
+        Returns:
+            list: List of :class:`HTMLElement` instances.
+        """
+        return self._childs
+
+    @childs.setter
+    def childs(self, childs):
+        if self._flags & _TRACKED:
+            if childs.__class__ is _ChildList:
+                childs._owner = self
+            elif isinstance(childs, list):
+                childs = _ChildList(childs, self)
+
+            _adopt(childs, self)
+            self._childs = childs
+            self._changed()
+            return
+
+        self._childs = childs
+
+    def _changed(self, params_only=False):
+        """
+        Record change of the :attr:`params` or :attr:`childs` of this element.
+
+        Strings cached by the :meth:`.HTMLElement.toString` of the element and
+        of all its parents (and of the opener of the endtag and its parents)
+        are dropped, they are no longer sliced from the :class:`.SourceText`
+        and the :class:`.DocumentIndex` of the parents is invalidated. The
+        tracked elements report the changes of their :attr:`params` and
+        :attr:`childs` automatically.
+
+        Args:
+            params_only (bool, default False): Only the :attr:`params` were
+                        changed, not the structure of the DOM.
+        """
+        # endtag is serialized by its opener, which may have other parents,
+        # when the endtag is not in the childs
+        opener = self.openertag
+        if opener is not None:
+            opener._changed(params_only)
+
+        el = self
+        while el is not None:
+            el._str_cache = None
+            el._flags &= ~_SOURCE
+
+            index = getattr(el, "_index", None)
+            if index is not None and params_only:
+                index.invalidateParams(el)
+            elif index is not None:
+                index.invalidate()
+
+            el = el._parent
+
     def isTag(self):
         """
         Returns:
             bool: True if the element is considered to be HTML tag.
         """
-        return self._istag
+        return self._flags & _TAG != 0
 
     def isEndTag(self):
         """
         Returns:
             bool: True if the element is end tag (``</endtag>``).
         """
-        return self._isendtag
+        return self._flags & _END_TAG != 0
 
     def isNonPairTag(self, isnonpair=None):
         """
@@ -324,16 +897,29 @@ class HTMLParser(object):
             book: True if tag is nonpair.
         """
         if isnonpair is None:
-            return self._isnonpairtag
+            return self._flags & _NONPAIR != 0
 
-        if not self._istag:
+        if not self._flags & _TAG:
             return
 
-        if isnonpair:
+        self._setNonPairTag(isnonpair)
+        self._changed()  # the childs may be removed
+
+    def _setNonPairTag(self, isnonpair):
+        """
+        Same as the :meth:`isNonPairTag` setter, but the change is not
+        tracked. Used by the :class:`.DOMBuilder` for the elements, which are
+        not finished yet.
+        """
+        if isnonpair and self._flags & _TRACKED:
             self.endtag = None
-            self.childs = []
+            self._childs = _ChildList((), self)
+        elif isnonpair:
+            self.endtag = None
+            self._childs = []
 
-        self._isnonpairtag = isnonpair
+        self._setFlag(_NONPAIR, isnonpair)
+        self._str_cache = None
 
     def isPairTag(self):
         """
@@ -358,13 +944,7 @@ class HTMLParser(object):
         Returns:
             bool: True if it is opening.
         """
-        if self.isTag() and \
-           not self.isComment() and \
-           not self.isEndTag() and \
-           not self.isNonPairTag():
-            return True
-
-        return False
+        return self._flags & _ALL == _TAG
 
     def isEndTagTo(self, opener):
         """
@@ -374,38 +954,93 @@ class HTMLParser(object):
         Returns:
             bool: True, if this element is endtag to `opener`.
         """
-        if not (self._isendtag and opener.isOpeningTag()):
+        if not (self._flags & _END_TAG and opener.isOpeningTag()):
             return False
 
-        return self._tagname.lower() == opener.getTagName().lower()
+        return self._tagkey == opener._tagkey
 
     def isComment(self):
         """
         Returns:
             bool: True if this element is encapsulating HTML comment.
         """
-        return self._iscomment
+        return self._flags & _COMMENT != 0
 
     def tagToString(self):
         """
         Get HTML element representation of the tag, but only the tag, not the
         :attr:`childs` or :attr:`endtag`.
 
+        Note:
+            The output is cached, until the :attr:`params` are changed. Only
+            the changes of :class:`.CaseInsensitiveDict` (default type of the
+            :attr:`params`) can be tracked, so the tags with the parameters
+            stored in other types are not cached.
+
         Returns:
             str: HTML representation.
         """
-        def is_el_without_params():
-            return not self.params and "=" not in self._element
+        if not self.isTag() or self.isComment():
+            return self._element
+
+        params = self._params
+
+        # don't parse the params if the raw tag is already in the right form
+        if params is None:
+            if self._flags & _CANONICAL:
+                return self._element
+
+            if self._isCanonical():
+                self._flags |= _CANONICAL
+                return self._element
 
-        if not self.isTag() or self.isComment() or is_el_without_params():
+            params = self.params
+
+        if not params and "=" not in self._element:
             return self._element
 
+        version = getattr(params, "_changes", None)
+        cache = self._tag_cache
+        if cache is not None and cache[0] is params and cache[1] == version:
+            return cache[2]
+
         output = "<" + str(self._tagname)
 
-        for key in self.params:
-            output += " " + key + "=\"" + escape(self.params[key], '"') + "\""
+        for key in params:
+            output += " " + key + "=\"" + escape(params[key], '"') + "\""
+
+        output += " />" if self._flags & _NONPAIR else ">"
+
+        if version is not None:
+            self._tag_cache = (params, version, output)
+
+        return output
+
+    def _isCanonical(self):
+        """
+        Check, whether the unparsed tag would be serialized back to the same
+        string by :meth:`tagToString`.
+
+        Returns:
+            bool: True if the :attr:`_element` is in canonical form.
+        """
+        if "=" not in self._element:  # no params
+            return True
+
+        match = _CANONICAL_TAG.match(self._element)
+        if not match or match.group(1) != self._tagname:
+            return False
+
+        if (match.group(4) == " />") != (self._flags & _NONPAIR != 0):
+            return False
+
+        # duplicate keys are merged by the dictionary
+        keys = [
+            key.lower()
+            for key in _CANONICAL_PARAM.findall(match.group(2))
+        ]
 
-        return output + " />" if self._isnonpairtag else output + ">"
+        return len(keys) == len(set(keys))
 
     def getTagName(self):
         """
@@ -413,7 +1048,7 @@ class HTMLParser(object):
             str: Tag name or while element in case of normal text \
                  (``not isTag()``).
         """
-        if not self._istag:
+        if not self._flags & _TAG:
             return self._element
 
         return self._tagname
@@ -4,31 +4,215 @@
 # Interpreter version: python 2.7
 #
 # Imports =====================================================================
+from itertools import chain
+from itertools import islice
+
 from .html_parser import HTMLParser
+from .html_parser import _CONTAINER
+from .html_parser import _track
 
 from .html_parser import _is_str
 from .html_parser import _is_dict
 from .html_parser import _is_iterable
 
+from .html_index import DocumentIndex
+from .html_index import _walk
+from .html_index import _walk_breadth
+from .html_index import _has_id
+from .html_index import _has_classes
+from .html_matcher import Matcher
+from .html_matcher import _compile_query
+from .html_matcher import _match_children
+from .html_matcher import _match_descendants
+from .html_selector import compile_selector
+
 
 # Variables ===================================================================
 # Functions & classes =========================================================
 class HTMLQuery(HTMLParser):
+    __slots__ = ()
+
+    _index = None  # DocumentIndex, set only for the document roots
+
+    def buildIndex(self):
+        """
+        Build :class:`.DocumentIndex` of all subelements, which is then used
+        by :meth:`findAll` and :meth:`find` called on this element.
+
+        Index is built automatically by the parser, if the
+        :attr:`.ParserOptions.build_index` is set. Call this for the DOM
+        created manually. Changes of the DOM are tracked from then on, and
+        the index is rebuilt after them when it is used again.
+
+        Returns:
+            obj: :class:`.DocumentIndex` instance.
+        """
+        _track(self)
+        self._index = DocumentIndex.fromDOM(self)
+
+        return self._index
+
+    def _validIndex(self):
+        """
+        Returns:
+            obj: :class:`.DocumentIndex` rebuilt after the tracked changes of \
+                 the DOM, or None, if this element is not indexed.
+        """
+        index = self._index
+        if index is not None and not index.isValid():
+            index = self.buildIndex()
+
+        return index
+
+    def getElementById(self, element_id):
+        """
+        Find the first element with `id` parameter set to `element_id`.
+
+        In the document root with :class:`.DocumentIndex`, this is a simple
+        dictionary lookup, otherwise whole DOM is searched.
+
+        Example::
+
+            >>> dom = dhtmlparser.parseString('<div id="price">10</div>')
+            >>> dom.getElementById("price")
+            HTMLElement('<div id="price">10</div>')
+
+        Args:
+            element_id (str): Value of the `id` parameter.
+
+        Returns:
+            obj: :class:`.HTMLElement` instance or None, if not found.
+        """
+        if _has_id(self, element_id):
+            return self
+
+        index = self._validIndex()
+        if index is None:
+            candidates = _walk(self)
+        else:
+            candidates = index.ids.get(element_id, ())
+
+        for el in candidates:
+            if _has_id(el, element_id):
+                return el
+
+        return None
+
+    def getElementsByClassName(self, class_names):
+        """
+        Find all elements, which have all the `class_names` in their `class`
+        parameter.
+
+        In the document root with :class:`.DocumentIndex`, only the elements
+        with one of the `class_names` are checked.
+
+        Example::
+
+            >>> dom = dhtmlparser.parseString('<p class="a b">x</p><p>y</p>')
+            >>> dom.getElementsByClassName("b a")
+            [HTMLElement('<p class="a b">x</p>')]
+
+        Args:
+            class_names (str): Space separated names of the classes.
+
+        Returns:
+            list: List of :class:`.HTMLElement` instances in the document \
+                  order.
+        """
+        class_names = frozenset(class_names.split())
+        if not class_names:
+            return []
+
+        output = []
+        if _has_classes(self, class_names):
+            output.append(self)
+
+        index = self._validIndex()
+        if index is None:
+            candidates = _walk(self)
+        else:
+            # elements with the rarest of the classes
+            candidates = min(
+                (index.classes.get(name, ()) for name in class_names),
+                key=len
+            )
+
+        output.extend(el for el in candidates if _has_classes(el, class_names))
+
+        return output
+
+    def select(self, css):
+        """
+        Find all subelements matching the CSS selector `css`.
+
+        Supported are type, ``#id``, ``.class`` and attribute selectors,
+        ``:nth-child()`` and similar pseudo classes, all the combinators and
+        comma separated lists of selectors, see :mod:`.html_selector`. The
+        combinators are evaluated only inside this element.
+
+        In the document root with :class:`.DocumentIndex`, only the elements
+        with matching name, `id` or class are checked.
+
+        Example::
+
+            >>> dom = dhtmlparser.parseString('''
+            ... <ul id="menu"><li><a href="/">Home</a></li>
+            ... <li class="active"><a href="/about">About</a></li></ul>
+            ... ''')
+            >>> dom.select("#menu > li.active a[href^='/']")
+            [HTMLElement('<a href="/about">About</a>')]
+
+        Args:
+            css (str): CSS selector.
+
+        Returns:
+            list: List of :class:`.HTMLElement` instances in the document \
+                  order.
+
+        Raises:
+            ValueError: If the selector is not valid, or not supported.
+        """
+        selector = compile_selector(css)
+
+        return list(selector.iterSelect(self, self._validIndex()))
+
+    def select_one(self, css):
+        """
+        Same as :meth:`select`, but return only the first matching element.
+
+        Args:
+            css (str): CSS selector.
+
+        Returns:
+            obj: :class:`.HTMLElement` instance, or None, if not found.
+
+        Raises:
+            ValueError: If the selector is not valid, or not supported.
+        """
+        selector = compile_selector(css)
+
+        for el in selector.iterSelect(self, self._validIndex()):
+            return el
+
+        return None
+
     def containsParamSubset(self, params):
         """
         Test whether this element contains at least all `params`, or more.
 
         Args:
-            params (dict/SpecialDict): Subset of parameters.
+            params (dict/CaseInsensitiveDict): Subset of parameters.
 
         Returns:
             bool: True if all `params` are contained in this element.
         """
+        own_params = self.params
+
         for key in params.keys():
-            if key not in self.params:
+            if key not in own_params:
                 return False
 
-            if params[key] != self.params[key]:
+            if params[key] != own_params[key]:
                 return False
 
         return True
@@ -52,7 +236,10 @@ class HTMLQuery(HTMLParser):
         Returns:
             bool: True if two elements are almost equal.
         """
-        if isinstance(tag_name, self.__class__):
+        if isinstance(tag_name, Matcher):
+            return tag_name.matches(self)
+
+        if isinstance(tag_name, HTMLParser):
             return self.isAlmostEqual(
                 tag_name.getTagName(),
                 tag_name.params if tag_name.params else None
@@ -62,15 +249,24 @@ class HTMLQuery(HTMLParser):
         if fn and not fn(self):
             return False
 
-        # compare case sensitive?
-        comparator = self._tagname  # we need to make self._tagname lower
-        if not case_sensitive and tag_name:
+        # compare tagname
+        if tag_name and case_sensitive:
+            if tag_name != self._tagname:
+                return False
+
+        elif tag_name:
             tag_name = tag_name.lower()
-            comparator = comparator.lower()
+            comparator = self._tagkey  # lowercased self._tagname
 
-        # compare tagname
-        if tag_name and tag_name != comparator:
-            return False
+            if comparator is None:  # text and comments
+                # .lower() never makes the string shorter
+                if len(self._tagname) > len(tag_name):
+                    return False
+
+                comparator = self._tagname.lower()
+
+            if tag_name != comparator:
+                return False
 
         # None params = don't use parameters to compare equality
         if params is None:
@@ -86,92 +282,250 @@ class HTMLQuery(HTMLParser):
 
         return True
 
-    def find(self, tag_name, params=None, fn=None, case_sensitive=False):
+    def find(self, tag_name, params=None, fn=None, case_sensitive=False,
+             limit=None):
         """
         Same as :meth:`findAll`, but without `endtags`.
 
         You can always get them from :attr:`endtag` property.
         """
-        return [
-            x for x in self.findAll(tag_name, params, fn, case_sensitive)
-            if not x.isEndTag()
-        ]
+        return list(islice(
+            self.iterFind(tag_name, params, fn, case_sensitive),
+            limit
+        ))
 
-    def findB(self, tag_name, params=None, fn=None, case_sensitive=False):
+    def findB(self, tag_name, params=None, fn=None, case_sensitive=False,
+              limit=None, max_depth=None):
         """
         Same as :meth:`findAllB`, but without `endtags`.
 
         You can always get them from :attr:`endtag` property.
         """
-        return [
-            x for x in self.findAllB(tag_name, params, fn, case_sensitive)
-            if not x.isEndTag()
-        ]
+        return list(islice(
+            self.iterFindB(tag_name, params, fn, case_sensitive, max_depth),
+            limit
+        ))
+
+    def findFirst(self, tag_name, params=None, fn=None, case_sensitive=False):
+        """
+        Same as :meth:`find`, but return only the first matching element.
+
+        The search is stopped at the first match::
+
+            >>> dom.findFirst("h1")
+            HTMLElement('<h1>Title</h1>')
+
+        Returns:
+            obj: :class:`HTMLElement` instance, or None, if not found.
+        """
+        for el in self.iterFind(tag_name, params, fn, case_sensitive):
+            return el
+
+        return None
+
+    def iterFind(self, tag_name, params=None, fn=None, case_sensitive=False):
+        """
+        Same as :meth:`iterFindAll`, but without `endtags`.
+        """
+        for el in self.iterFindAll(tag_name, params, fn, case_sensitive):
+            if not el.isEndTag():
+                yield el
+
+    def iterFindAll(self, tag_name, params=None, fn=None,
+                    case_sensitive=False):
+        """
+        Same as :meth:`findAll`, but the matching elements are yielded one by
+        one, as they are found. The search stops, when you stop the
+        iteration::
 
-    def findAll(self, tag_name, params=None, fn=None, case_sensitive=False):
+            >>> has_form = any(True for _ in dom.iterFind("form"))
+
+        Note:
+            Changes of the DOM during the iteration may or may not be seen by
+            the search.
+        """
+        matcher = _compile_query(tag_name, params, fn, case_sensitive)
+        if matcher.matches(self):
+            yield self
+
+        candidates = None
+        index = self._validIndex()
+        if index is not None:
+            candidates = matcher.candidates(index)
+
+        if candidates is None:
+            candidates = _walk(self)
+
+        for el in candidates:
+            if matcher.matches(el):
+                yield el
+
+    def findMany(self, queries):
+        """
+        Run multiple :meth:`find` queries at once, in single pass thru the
+        DOM.
+
+        Example::
+
+            >>> dom.findMany({
+            ...     "title": "h1",
+            ...     "links": ("a", {"rel": "nofollow"}),
+            ...     "price": {"tag_name": "span", "params": {"id": "price"}},
+            ... })
+            {'title': [HTMLElement('<h1>')], 'links': [], 'price': [...]}
+
+        Args:
+            queries (dict): Key -> query. Query is name of the tag,
+                    :class:`.Matcher`, tuple of the :meth:`find` arguments,
+                    or dict of its keyword arguments.
+
+        Returns:
+            dict: Key -> list of the matching elements, same as returned by \
+                  :meth:`find`.
+
+        Raises:
+            KeyError: If the query is not valid.
+        """
+        output = {}
+        by_name = {}  # lowercased name -> [(matcher, output list), ..]
+        others = []
+        for key, query in queries.items():
+            if _is_iterable(query):
+                matcher = _compile_query(*query)
+            elif _is_dict(query):
+                matcher = _compile_query(**query)
+            elif _is_str(query) or isinstance(query, Matcher):
+                matcher = _compile_query(query)
+            else:
+                raise KeyError(
+                    "Unknown query type '%s': %s" % (type(query), query)
+                )
+
+            output[key] = []
+            if matcher._key is not None and not matcher.case_sensitive:
+                by_name.setdefault(matcher._key, []).append(
+                    (matcher, output[key])
+                )
+            else:
+                others.append((matcher, output[key]))
+
+        longest_name = max([len(name) for name in by_name] or [0])
+
+        for el in chain([self], _walk(self)):
+            if el.isEndTag():
+                continue
+
+            name = el._tagkey
+            if name is None and len(el._tagname) <= longest_name:
+                name = el._tagname.lower()  # text and comments
+
+            for matcher, found in by_name.get(name, ()):
+                if matcher.matches(el):
+                    found.append(el)
+
+            for matcher, found in others:
+                if matcher.matches(el):
+                    found.append(el)
+
+        return output
+
+    def findAll(self, tag_name, params=None, fn=None, case_sensitive=False,
+                limit=None):
         """
         Search for elements by their parameters using `Depth-first algorithm
         <http://en.wikipedia.org/wiki/Depth-first_search>`_.
 
         Args:
-            tag_name (str): Name of the tag you are looking for. Set to "" if
-                            you wish to use only `fn` parameter.
+            tag_name (str/obj): Name of the tag you are looking for, or
+                     :class:`.Matcher`. Set to "" if you wish to use only `fn`
+                     parameter.
             params (dict, default None): Parameters which have to be present
                    in tag to be considered matching.
             fn (function, default None): Use this function to match tags.
                Function expects one parameter which is HTMLElement instance.
             case_sensitive (bool, default False): Use case sensitive search.
+            limit (int, default None): Stop the search after `limit` matches.
 
         Returns:
             list: List of :class:`HTMLElement` instances matching your \
                   criteria.
-        """
-        output = []
-
-        if self.isAlmostEqual(tag_name, params, fn, case_sensitive):
-            output.append(self)
-
-        tmp = []
-        for el in self.childs:
-            tmp = el.findAll(tag_name, params, fn, case_sensitive)
-
-            if tmp:
-                output.extend(tmp)
 
-        return output
+        Note:
+            When called on the document root with :class:`.DocumentIndex`,
+            only the elements with matching name or `id` are checked.
+        """
+        return list(islice(
+            self.iterFindAll(tag_name, params, fn, case_sensitive),
+            limit
+        ))
 
-    def findAllB(self, tag_name, params=None, fn=None, case_sensitive=False):
+    def findAllB(self, tag_name, params=None, fn=None, case_sensitive=False,
+                 limit=None, max_depth=None):
         """
         Simple search engine using `Breadth-first algorithm
         <http://en.wikipedia.org/wiki/Breadth-first_search>`_.
 
         Args:
-            tag_name (str): Name of the tag you are looking for. Set to "" if
-                            you wish to use only `fn` parameter.
+            tag_name (str/obj): Name of the tag you are looking for, or
+                     :class:`.Matcher`. Set to "" if you wish to use only `fn`
+                     parameter.
             params (dict, default None): Parameters which have to be present
                    in tag to be considered matching.
             fn (function, default None): Use this function to match tags.
                Function expects one parameter which is HTMLElement instance.
             case_sensitive (bool, default False): Use case sensitive search.
+            limit (int, default None): Stop the search after `limit` matches.
+            max_depth (int, default None): Search only `max_depth` levels of
+                      the subelements (``1`` for the :attr:`childs`).
 
         Returns:
             list: List of :class:`HTMLElement` instances matching your \
                   criteria.
         """
-        output = []
-
-        if self.isAlmostEqual(tag_name, params, fn, case_sensitive):
-            output.append(self)
-
-        breadth_search = self.childs
-        for el in breadth_search:
-            if el.isAlmostEqual(tag_name, params, fn, case_sensitive):
-                output.append(el)
+        return list(islice(
+            self.iterFindAllB(
+                tag_name,
+                params,
+                fn,
+                case_sensitive,
+                max_depth
+            ),
+            limit
+        ))
+
+    def iterFindB(self, tag_name, params=None, fn=None, case_sensitive=False,
+                  max_depth=None):
+        """
+        Same as :meth:`iterFindAllB`, but without `endtags`.
+        """
+        elements = self.iterFindAllB(
+            tag_name,
+            params,
+            fn,
+            case_sensitive,
+            max_depth
+        )
+        for el in elements:
+            if not el.isEndTag():
+                yield el
+
+    def iterFindAllB(self, tag_name, params=None, fn=None,
+                     case_sensitive=False, max_depth=None):
+        """
+        Same as :meth:`findAllB`, but the matching elements are yielded one by
+        one, as they are found.
 
-            if el.childs:
-                breadth_search.extend(el.childs)
+        Note:
+            Changes of the DOM during the iteration may or may not be seen by
+            the search.
+        """
+        matcher = _compile_query(tag_name, params, fn, case_sensitive)
+        if matcher.matches(self):
+            yield self
 
-        return output
+        for el in _walk_breadth(self, max_depth):
+            if matcher.matches(el):
+                yield el
 
     def wfind(self, tag_name, params=None, fn=None, case_sensitive=False):
         """
@@ -204,8 +558,9 @@ class HTMLQuery(HTMLParser):
             '<xe id="wanted xe" />'
 
         Args:
-            tag_name (str): Name of the tag you are looking for. Set to "" if
-                            you wish to use only `fn` parameter.
+            tag_name (str/obj): Name of the tag you are looking for, or
+                     :class:`.Matcher`. Set to "" if you wish to use only `fn`
+                     parameter.
             params (dict, default None): Parameters which have to be present
                    in tag to be considered matching.
             fn (function, default None): Use this function to match tags.
@@ -216,23 +571,22 @@ class HTMLQuery(HTMLParser):
             obj: Blank HTMLElement with all matches in :attr:`childs` property.
 
         Note:
-            Returned element also have set :attr:`_container` property to True.
+            Returned element also have set ``_CONTAINER`` bit in the
+            :attr:`_flags` property.
         """
         childs = self.childs
-        if self._container:  # container object
-            childs = map(
-                lambda x: x.childs,
-                filter(lambda x: x.childs, self.childs)
-            )
-            childs = sum(childs, [])  # flattern the list
+        if self._flags & _CONTAINER:  # container object
+            childs = [child for el in self._childs for child in el._childs]
+
+        matcher = _compile_query(tag_name, params, fn, case_sensitive)
 
         el = self.__class__()  # HTMLElement()
-        el._container = True
+        el._flags |= _CONTAINER
         for child in childs:
             if child.isEndTag():
                 continue
 
-            if child.isAlmostEqual(tag_name, params, fn, case_sensitive):
+            if matcher.matches(child):
                 el.childs.append(child)
 
         return el
@@ -287,7 +641,7 @@ class HTMLQuery(HTMLParser):
             *args: List of :meth:`wfind` parameters.
             absolute (bool, default None): If true, first element will be
                      searched from the root of the DOM. If None,
-                     :attr:`_container` attribute will be used to decide value
+                     ``_CONTAINER`` flag will be used to decide value
                      of this argument. If False, :meth:`find` call will be run
                      first to find first element, then :meth:`wfind` will be
                      used to progress to next arguments.
@@ -299,47 +653,31 @@ class HTMLQuery(HTMLParser):
         if not args:
             return self.childs
 
-        # pop one argument from argument stack (tuples, so .pop() won't work)
-        act = args[0]
-        args = args[1:]
-
-        # this is used to define relative/absolute root of the first element
-        def wrap_find(*args, **kwargs):
-            """
-            Find wrapper, to allow .wfind() to be substituted witřh .find()
-            call, which normally returns blank array instead of blank
-            `container` element.
-            """
-            el = self.__class__()  # HTMLElement()
-            el.childs = self.find(*args, **kwargs)
-            return el
-
-        # if absolute is not specified (ie - next recursive call), use
-        # self._container, which is set to True by .wfind(), so next search
-        # will be absolute from the given element
+        matchers = []
+        for act in args:
+            if _is_iterable(act):
+                matchers.append(_compile_query(*act))
+            elif _is_dict(act):
+                matchers.append(_compile_query(**act))
+            elif _is_str(act) or isinstance(act, Matcher):
+                matchers.append(_compile_query(act))
+            else:
+                raise KeyError(
+                    "Unknown parameter type '%s': %s" % (type(act), act)
+                )
+
+        # if absolute is not specified, use self._CONTAINER flag, which is
+        # set by .wfind(), so the search will be absolute from the given
+        # element
         absolute = kwargs.get("absolute", None)
         if absolute is None:
-            absolute = self._container
-
-        find_func = self.wfind if absolute else wrap_find
+            absolute = self._flags & _CONTAINER
 
-        result = None
-        if _is_iterable(act):
-            result = find_func(*act)
-        elif _is_dict(act):
-            result = find_func(**act)
-        elif _is_str(act):
-            result = find_func(act)
-        else:
-            raise KeyError(
-                "Unknown parameter type '%s': %s" % (type(act), act)
-            )
-
-        if not result.childs:
-            return []
+        if not absolute:
+            return _match_descendants(self, matchers)
 
-        match = result.match(*args)
+        level = self.childs
+        if self._flags & _CONTAINER:
+            level = [child for el in self._childs for child in el._childs]
 
-        # just to be sure return always blank array, when the match is
-        # False/None and so on (it shouldn't be, but ..)
-        return match if match else []
+        return _match_children(level, matchers)
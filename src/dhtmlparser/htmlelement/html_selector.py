@@ -0,0 +1,446 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+CSS selectors used by :meth:`.HTMLQuery.select`.
+
+Selectors are compiled to :class:`Selector` objects, which are kept in small
+LRU cache. They are matched from right to left - the rightmost compound
+selector is checked first and only the matching elements are checked against
+their ancestors and siblings.
+
+Supported are type selectors (``div``, ``*``), ``#id``, ``.class``,
+attribute selectors (``[attr]``, ``[attr=value]``, ``~=``, ``|=``, ``^=``,
+``$=`` and ``*=``), ``:nth-child()``, ``:nth-last-child()``,
+``:first-child`` and ``:last-child`` pseudo classes, descendant (`` ``),
+child (``>``), adjacent sibling (``+``) and general sibling (``~``)
+combinators and comma separated lists of selectors.
+"""
+# Imports =====================================================================
+import re
+import threading
+from collections import OrderedDict
+
+from .html_index import _TreeMap
+from .html_index import _is_tag
+from .html_index import _id_and_classes
+
+
+# Variables ===================================================================
+_SELECTOR_TOKEN = re.compile(
+    r"""
+    \s*(?P<combinator>[>+~,])\s*
+    | (?P<descendant>\s+)
+    | (?P<type>\*|[-\w]+)
+    | \#(?P<id>[-\w]+)
+    | \.(?P<class>[-\w]+)
+    | \[\s*(?P<attr>[-\w:.]+)\s*
+      (?:
+        (?P<operator>[~|^$*]?=)\s*
+        (?:"(?P<dq_value>[^"]*)"|'(?P<sq_value>[^']*)'|(?P<value>[-\w]+))\s*
+      )?
+      \]
+    | :(?P<pseudo>[-\w]+)(?:\(\s*(?P<argument>[^)]*?)\s*\))?
+    """,
+    re.VERBOSE
+)
+_NTH = re.compile(r"([+-]?\d*)n(?:\s*([+-])\s*(\d+))?\Z|([+-]?\d+)\Z")
+
+_ATTRIBUTE_OPERATORS = {
+    None: lambda actual, value: True,
+    "=": lambda actual, value: actual == value,
+    "~=": lambda actual, value: value in actual.split(),
+    "|=": lambda actual, value: (actual + "-").startswith(value + "-"),
+    "^=": lambda actual, value: bool(value) and actual.startswith(value),
+    "$=": lambda actual, value: bool(value) and actual.endswith(value),
+    "*=": lambda actual, value: bool(value) and value in actual,
+}
+
+_CACHE = OrderedDict()  # css -> compiled Selector, last used at the end
+_CACHE_LIMIT = 256
+_CACHE_LOCK = threading.Lock()
+
+
+# Functions & objects =========================================================
+def _parse_nth(argument):
+    """
+    Parse ``an+b`` argument of the ``:nth-child()``.
+
+    Returns:
+        tuple: ``(a, b)``.
+
+    Raises:
+        ValueError: If the `argument` is not valid.
+    """
+    argument = argument.replace(" ", "").lower()
+    if argument == "odd":
+        return 2, 1
+    if argument == "even":
+        return 2, 0
+
+    match = _NTH.match(argument)
+    if not match:
+        raise ValueError("Invalid :nth-child() argument %r!" % argument)
+
+    a, sign, b, number = match.groups()
+    if number is not None:
+        return 0, int(number)
+
+    if a in ("", "+", "-"):
+        a += "1"
+
+    b = int(b or 0)
+    if sign == "-":
+        b = -b
+
+    return int(a), b
+
+
+class _Compound(object):
+    """
+    Compound selector (``div.class[attr]:first-child``), which tests single
+    element.
+    """
+    __slots__ = ("tag", "element_id", "classes", "attributes", "nth")
+
+    def __init__(self):
+        self.tag = None  # lowercased name, None for any
+        self.element_id = None
+        self.classes = frozenset()
+        self.attributes = []  # (name, operator function, value)
+        self.nth = []  # (a, b, from_end)
+
+    def matches(self, el, tree):
+        """
+        Args:
+            el (obj): :class:`.HTMLElement` instance.
+            tree (obj): :class:`._TreeMap` with the position of `el`.
+
+        Returns:
+            bool: True if the `el` matches this compound selector.
+        """
+        if not _is_tag(el):
+            return False
+
+        if self.tag is not None and self.tag != el._tagkey:
+            return False
+
+        if self.element_id is not None or self.classes:
+            element_id, classes = _id_and_classes(el)
+
+            if self.element_id is not None and self.element_id != element_id:
+                return False
+
+            if not classes >= self.classes:
+                return False
+
+        if self.attributes:
+            params = el.params
+            for name, operator, value in self.attributes:
+                actual = params.get(name)
+                if actual is None or not operator(actual, value):
+                    return False
+
+        for a, b, from_end in self.nth:
+            position, count = tree.tagPosition(el)
+            if position is None:
+                return False
+
+            # 1-based position among the siblings
+            position = count - position if from_end else position + 1
+            if a == 0:
+                if position != b:
+                    return False
+            elif (position - b) % a != 0 or (position - b) // a < 0:
+                return False
+
+        return True
+
+    def isIndexable(self):
+        """
+        Returns:
+            bool: True if the matching elements can be found by
+            :meth:`candidates`.
+        """
+        return bool(self.element_id is not None or self.classes or self.tag)
+
+    def candidates(self, index):
+        """
+        Return list of elements from the `index`, which may match.
+
+        Args:
+            index (obj): :class:`.DocumentIndex` instance.
+
+        Returns:
+            list: Elements in the document order.
+        """
+        if self.element_id is not None:
+            return index.ids.get(self.element_id, ())
+
+        if self.classes:
+            return min(
+                (index.classes.get(name, ()) for name in self.classes),
+                key=len
+            )
+
+        return index.tags.get(self.tag, ())
+
+
+class _ComplexSelector(object):
+    """
+    Compound selectors joined by the combinators, stored from right to left.
+    """
+    __slots__ = ("rightmost", "rest")
+
+    def __init__(self, compounds, combinators):
+        self.rightmost = compounds[-1]
+
+        # (combinator, compound) pairs from the right
+        self.rest = list(zip(reversed(combinators), reversed(compounds[:-1])))
+
+    def matches(self, el, tree):
+        """
+        Args:
+            el (obj): :class:`.HTMLElement` instance.
+            tree (obj): :class:`._TreeMap` with the positions of the `el` and
+                 all its ancestors.
+
+        Returns:
+            bool: True if the `el` matches this selector.
+        """
+        return self.rightmost.matches(el, tree) and \
+            self._matches_rest(el, 0, tree)
+
+    def _matches_rest(self, el, position, tree):
+        if position >= len(self.rest):
+            return True
+
+        combinator, compound = self.rest[position]
+
+        if combinator == " ":
+            candidates = _ancestors(el, tree)
+        elif combinator == ">":
+            parent = tree.parent(el)
+            candidates = [parent] if parent is not None else []
+        elif combinator == "+":
+            candidates = _first(tree.previousTags(el))
+        else:  # "~"
+            candidates = tree.previousTags(el)
+
+        for candidate in candidates:
+            if compound.matches(candidate, tree) and \
+               self._matches_rest(candidate, position + 1, tree):
+                return True
+
+        return False
+
+
+def _ancestors(el, tree):
+    """
+    Returns:
+        list: Tags containing the `el` in the :attr:`._TreeMap.root`, from \
+              the nearest.
+    """
+    ancestors = []
+
+    parent = tree.parent(el)
+    while parent is not None and _is_tag(parent):
+        ancestors.append(parent)
+        parent = tree.parent(parent)
+
+    return ancestors
+
+
+def _first(iterator):
+    for item in iterator:
+        return [item]
+
+    return []
+
+
+class Selector(object):
+    """
+    Compiled CSS selector.
+
+    Use :func:`compile_selector` to get the cached instances.
+
+    Args:
+        css (str): CSS selector.
+
+    Raises:
+        ValueError: If the selector is not valid, or not supported.
+    """
+    def __init__(self, css):
+        self.css = css
+        self.selectors = []  # one _ComplexSelector for each comma part
+
+        self._parse(css.strip())
+
+    def _parse(self, css):
+        compounds = [_Compound()]
+        combinators = []
+        empty = True  # nothing was added to compounds[-1]
+
+        position = 0
+        while position < len(css):
+            match = _SELECTOR_TOKEN.match(css, position)
+            if not match or match.end() == position:
+                raise ValueError(
+                    "Invalid selector %r at position %d!" % (css, position)
+                )
+
+            position = match.end()
+            kind = match.lastgroup
+            if kind in ("dq_value", "sq_value", "value", "operator"):
+                kind = "attr"
+            elif kind == "argument":
+                kind = "pseudo"
+
+            if kind in ("combinator", "descendant"):
+                if empty:
+                    raise ValueError("Missing selector in %r!" % css)
+
+                combinator = match.group("combinator") or " "
+                if combinator == ",":
+                    self.selectors.append(
+                        _ComplexSelector(compounds, combinators)
+                    )
+                    compounds = [_Compound()]
+                    combinators = []
+                else:
+                    compounds.append(_Compound())
+                    combinators.append(combinator)
+
+                empty = True
+                continue
+
+            compound = compounds[-1]
+            if kind == "type":
+                if not empty:
+                    raise ValueError("Misplaced type selector in %r!" % css)
+
+                if match.group("type") != "*":
+                    compound.tag = match.group("type").lower()
+
+            elif kind == "id":
+                compound.element_id = match.group("id")
+
+            elif kind == "class":
+                compound.classes |= frozenset([match.group("class")])
+
+            elif kind == "attr":
+                value = match.group("value")
+                if value is None:
+                    value = match.group("dq_value")
+                if value is None:
+                    value = match.group("sq_value")
+
+                compound.attributes.append((
+                    match.group("attr"),
+                    _ATTRIBUTE_OPERATORS[match.group("operator")],
+                    value,
+                ))
+
+            else:
+                self._parse_pseudo(
+                    compound,
+                    match.group("pseudo").lower(),
+                    match.group("argument"),
+                )
+
+            empty = False
+
+        if empty:
+            raise ValueError("Missing selector in %r!" % css)
+
+        self.selectors.append(_ComplexSelector(compounds, combinators))
+
+    @staticmethod
+    def _parse_pseudo(compound, name, argument):
+        if name in ("first-child", "last-child") and argument is None:
+            compound.nth.append((0, 1, name == "last-child"))
+
+        elif name in ("nth-child", "nth-last-child") and argument:
+            a, b = _parse_nth(argument)
+            compound.nth.append((a, b, name == "nth-last-child"))
+
+        else:
+            raise ValueError("Unsupported pseudo class :%s!" % name)
+
+    def iterSelect(self, dom, index=None):
+        """
+        Iterate over the subelements of the `dom` matching this selector, in
+        the document order.
+
+        Args:
+            dom (obj): :class:`.HTMLElement` instance.
+            index (obj, default None): :class:`.DocumentIndex` of the `dom`.
+                  If set, the rightmost compound selectors are looked up in
+                  it instead of walking the whole DOM.
+        """
+        indexable = all(
+            selector.rightmost.isIndexable() for selector in self.selectors
+        )
+        if index is None or not indexable:
+            tree = _TreeMap(dom)
+            for el in tree.walk():
+                for selector in self.selectors:
+                    if selector.matches(el, tree):
+                        yield el
+                        break
+            return
+
+        tree = index.getTreeMap(dom)
+        if len(self.selectors) == 1:
+            selector = self.selectors[0]
+            for el in selector.rightmost.candidates(index):
+                if id(el) in tree.order and selector.matches(el, tree):
+                    yield el
+            return
+
+        matching = {}
+        for selector in self.selectors:
+            for el in selector.rightmost.candidates(index):
+                if id(el) in tree.order and id(el) not in matching and \
+                   selector.matches(el, tree):
+                    matching[id(el)] = el
+
+        for el_id in sorted(matching, key=tree.order.__getitem__):
+            yield matching[el_id]
+
+    def __repr__(self):
+        return "Selector(%r)" % self.css
+
+
+def compile_selector(css):
+    """
+    Return compiled :class:`Selector` for the `css`.
+
+    Last :attr:`_CACHE_LIMIT` selectors are cached, so each of them is
+    parsed only once.
+
+    Args:
+        css (str): CSS selector.
+
+    Returns:
+        obj: :class:`Selector` instance.
+
+    Raises:
+        ValueError: If the selector is not valid, or not supported.
+    """
+    with _CACHE_LOCK:
+        selector = _CACHE.pop(css, None)
+        if selector is not None:
+            _CACHE[css] = selector  # move to the end
+            return selector
+
+    selector = Selector(css)
+
+    with _CACHE_LOCK:
+        _CACHE[css] = selector
+        while len(_CACHE) > _CACHE_LIMIT:
+            _CACHE.popitem(last=False)
+
+    return selector
@@ -0,0 +1,186 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Parsed text kept for the elements, see :attr:`.ParserOptions.keep_source`.
+"""
+# Imports =====================================================================
+from bisect import bisect_right
+
+from .html_parser import _SOURCE
+
+
+# Functions & objects =========================================================
+class SourceText(object):
+    """
+    Text of the parsed document and the positions of its elements.
+
+    Tokens of the :class:`.Tokenizer` cover the input without gaps, so the
+    position of each element is the sum of the lengths of the tokens before
+    it. The positions are recorded by :meth:`locate`, when the elements are
+    created.
+
+    Unchanged elements are serialized by slicing the text, so the
+    :meth:`.HTMLElement.toString` returns exactly the parsed string. Changes
+    of the elements are tracked (see :meth:`.HTMLElement._changed`), so the
+    slicing is switched off only for the changed element and its parents.
+
+    Attributes:
+        length (int): Length of the text added so far.
+    """
+    def __init__(self):
+        self.length = 0
+
+        self._chunks = []
+        self._position = 0  # where the next located element starts
+        self._line_starts = None
+        self._discarded = False
+
+    @property
+    def text(self):
+        """
+        Whole parsed text.
+        """
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+
+        return self._chunks[0] if self._chunks else ""
+
+    def append(self, chunk):
+        """
+        Add next `chunk` of the parsed text. Only its length is recorded
+        after :meth:`discard`.
+        """
+        self.length += len(chunk)
+        if self._discarded:
+            return
+
+        self._chunks.append(chunk)
+        self._line_starts = None
+
+    def locate(self, el):
+        """
+        Record position of the `el`, which was created from the token
+        following the previously located one.
+
+        Args:
+            el (obj): :class:`.HTMLElement` instance.
+
+        Returns:
+            obj: The `el`.
+        """
+        el._source_pos = (self, self._position)
+        el._flags |= _SOURCE
+        self._position += len(el._element)
+
+        return el
+
+    def locateRoot(self, root):
+        """
+        Locate the `root` of the DOM, which spans the whole text. Call this
+        before the parsing, so the changes made while the text is parsed are
+        recorded too.
+
+        Args:
+            root (obj): Container, which will be returned by the parser.
+        """
+        root._source_pos = (self, 0, None)  # end is the final `length`
+        root._flags |= _SOURCE
+
+    def discard(self):
+        """
+        Switch the slicing off for good, because the DOM doesn't match the
+        text anymore (the finished elements were removed by the
+        :class:`.IterParser`).
+
+        The text is dropped, so it doesn't take the memory. Positions of the
+        elements (see :meth:`.HTMLElement.getSpan`) are still recorded, but
+        they can't be converted to the lines and columns.
+        """
+        self._discarded = True
+        self._chunks = []
+        self._line_starts = None
+
+    def isValid(self):
+        """
+        Returns:
+            bool: False, if the elements can't be sliced from the text.
+        """
+        return not self._discarded
+
+    def lineAndColumn(self, offset):
+        """
+        Args:
+            offset (int): Position in the :attr:`text`.
+
+        Returns:
+            tuple: ``(line, column)``, both starting from ``1``, or None, if \
+                   the text was discarded.
+        """
+        if self._discarded:
+            return None
+
+        if self._line_starts is None:
+            text = self.text
+            line_starts = [0]
+
+            index = text.find("\n")
+            while index >= 0:
+                line_starts.append(index + 1)
+                index = text.find("\n", index + 1)
+
+            self._line_starts = line_starts
+
+        line = bisect_right(self._line_starts, offset)
+
+        return line, offset - self._line_starts[line - 1] + 1
+
+    def __reduce__(self):
+        # changes of the copied DOM are tracked, so it can be sliced too
+        return (_unpickle_source, (self.text, self._discarded))
+
+
+def _unpickle_source(text, discarded=True):
+    source = SourceText()
+    source.append(text)
+    if discarded:
+        source.discard()
+
+    return source
+
+
+def _span(el):
+    """
+    Return ``(source, start, end)`` of the whole `el` (with its childs and
+    endtag), or None, if it is not known.
+    """
+    position = el._source_pos
+    if position is None:
+        return None
+
+    if len(position) == 3:  # root of the DOM
+        source = position[0]
+        return source, 0, source.length
+
+    source, start = position
+
+    end = start + len(el._element)
+    endtag = el.endtag
+    if endtag is not None and endtag._source_pos is not None and \
+       endtag._source_pos[0] is source:
+        end = endtag._source_pos[1] + len(endtag._element)
+
+    return source, start, end
+
+
+def _source_string(el):
+    """
+    Return the parsed string of the located `el`, sliced from the source
+    text. Check the :meth:`SourceText.isValid` and the ``_SOURCE`` flag of
+    the `el` first.
+    """
+    source, start, end = _span(el)
+
+    return source.text[start:end]
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Options of the parser.
+"""
+# Imports =====================================================================
+from .htmlelement.shared import NONPAIR_TAGS
+
+
+# Functions & objects =========================================================
+class ParserOptions(object):
+    """
+    Settings of one parse, given to :func:`.parseString` and other parsing
+    functions.
+
+    Options are passed down to the construction of the elements instead of
+    changing the module globals, so the concurrent parses with different
+    options don't affect each other.
+
+    Example::
+
+        >>> xml = dhtmlparser.ParserOptions(cip=False, nonpair_tags=[])
+        >>> dom = dhtmlparser.parseString("<Item><br></Item>", options=xml)
+        >>> dom.find("br")[0].isNonPairTag()
+        False
+
+    Attributes:
+        cip (bool, default True): Case Insensitive Parameters. Use
+            :class:`.CaseInsensitiveDict` to store the
+            :attr:`.HTMLElement.params`, plain ``dict`` otherwise.
+        nonpair_tags (list, default None): Names of the tags, which are
+            always nonpair. Set this to blank list, if you wish to parse XML.
+            Default is the global :attr:`.NONPAIR_TAGS` list.
+        disable_gc (bool, default True): Disable the garbage collector while
+            parsing. This makes the parsing of big documents faster. See
+            :func:`.paused_gc`.
+        freeze_gc (bool, default False): Move the finished DOM (and all other
+            objects) out of the collector's generations. Use this only for
+            the DOMs cached for the whole life of the process, see
+            :func:`.gc_policy.freeze`.
+        build_index (bool, default False): Build :class:`.DocumentIndex`
+            while parsing, so the :meth:`.HTMLQuery.find`,
+            :meth:`.HTMLQuery.getElementById` and
+            :meth:`.HTMLQuery.getElementsByClassName` called on the returned
+            document root check only the elements with matching name, `id`
+            or class.
+        cache_strings (bool, default False): Cache the output of the
+            :meth:`.HTMLElement.toString` (and ``str()``) of the parsed
+            elements, so the unchanged subtrees are serialized only once.
+            Changes of the :attr:`.HTMLElement.childs` lists and of the
+            :attr:`.HTMLElement.params` dictionaries are tracked and drop the
+            cached strings of the changed element and of its parents.
+        keep_source (bool, default False): Keep the parsed text and the
+            positions of the elements in it (see :class:`.SourceText`).
+            Unchanged elements are serialized by slicing the text, so the
+            :meth:`.HTMLElement.toString` returns exactly the original
+            string, and :meth:`.HTMLElement.getPosition` returns line and
+            column of the element.
+    """
+    def __init__(self, cip=True, nonpair_tags=None, disable_gc=True,
+                 freeze_gc=False, build_index=False, cache_strings=False,
+                 keep_source=False):
+        self.cip = cip
+        self.disable_gc = disable_gc
+        self.freeze_gc = freeze_gc
+        self.build_index = build_index
+        self.cache_strings = cache_strings
+        self.keep_source = keep_source
+
+        if nonpair_tags is None:
+            self.nonpair_tags = NONPAIR_TAGS
+        else:
+            self.nonpair_tags = frozenset(x.lower() for x in nonpair_tags)
+
+    def __repr__(self):
+        return (
+            "ParserOptions(cip=%r, nonpair_tags=%r, disable_gc=%r, "
+            "freeze_gc=%r, build_index=%r, cache_strings=%r, "
+            "keep_source=%r)" % (
+                self.cip,
+                self.nonpair_tags,
+                self.disable_gc,
+                self.freeze_gc,
+                self.build_index,
+                self.cache_strings,
+                self.keep_source,
+            )
+        )
+
+
+#: Options used when no other options are given.
+DEFAULT_OPTIONS = ParserOptions()
@@ -4,9 +4,15 @@
 # Interpreter version: python 2.7
 #
 # Imports =====================================================================
+import sys
 from collections import OrderedDict
 
 
+# Variables ===================================================================
+# plain dict keeps the insertion order since python 3.7
+_ORDERED_DICT = dict if sys.version_info >= (3, 7) else OrderedDict
+
+
 # Functions & objects =========================================================
 def _lower_if_str(item):
     """
@@ -35,6 +41,10 @@ class SpecialDict(OrderedDict):
     """
     This dictionary stores items case sensitive, but compare them case
     INsensitive.
+
+    Note:
+        Kept for backward compatibility. :attr:`.HTMLElement.params` are
+        stored in faster :class:`CaseInsensitiveDict`.
     """
     def __init__(self, *args, **kwargs):
         # lower_key -> key mapping
@@ -162,3 +172,267 @@ class SpecialDict(OrderedDict):
             return list(self._super.values(*args, **kwargs))
 
         return self._super.values(*args, **kwargs)
+
+
+class CaseInsensitiveDict(_ORDERED_DICT):
+    """
+    Dictionary, which stores keys case sensitive, but compares them case
+    INsensitive, same as :class:`SpecialDict`.
+
+    Items are stored directly in the dictionary, so the iteration, ``len()``
+    and views are native. Lowercased keys are mapped to the real keys only for
+    the keys, which are not lowercase (rare for the HTML parameters), so the
+    membership test is O(1) without second dictionary for each element.
+
+    Example::
+
+        >>> d = CaseInsensitiveDict([("ID", "x"), ("class", "y")])
+        >>> d["id"], "CLASS" in d
+        ('x', True)
+        >>> list(d.keys())
+        ['ID', 'class']
+    """
+    _aliases = None  # lowercased key -> key, for keys which are not lowercase
+    _changes = 0  # number of changes, used to invalidate the cached strings
+    _owner = None  # element notified about the changes, see HTMLElement
+
+    def __init__(self, *args, **kwargs):
+        _ORDERED_DICT.__init__(self)
+
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def _changed(self):
+        """
+        Count the change and report it to the :attr:`_owner`.
+        """
+        self._changes += 1
+
+        if self._owner is not None:
+            self._owner._changed(True)
+
+    def _real_key(self, key):
+        """
+        Return the key under which the `key` is stored, or `key` itself, if
+        it is not in the dictionary.
+        """
+        if _ORDERED_DICT.__contains__(self, key):
+            return key
+
+        lower_key = _lower_if_str(key)
+        if lower_key is not key and \
+           _ORDERED_DICT.__contains__(self, lower_key):
+            return lower_key
+
+        if self._aliases:
+            return self._aliases.get(lower_key, key)
+
+        return key
+
+    def __getitem__(self, key):
+        try:
+            return _ORDERED_DICT.__getitem__(self, self._real_key(key))
+        except KeyError:
+            raise KeyError(repr(key))
+
+    def __setitem__(self, key, value):
+        real_key = self._real_key(key)
+
+        # same as SpecialDict - the key is moved to the end
+        if _ORDERED_DICT.__contains__(self, real_key):
+            self.__delitem__(real_key)
+
+        lower_key = _lower_if_str(key)
+        if lower_key != key:
+            if self._aliases is None:
+                self._aliases = {}
+            self._aliases[lower_key] = key
+
+        _ORDERED_DICT.__setitem__(self, key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        real_key = self._real_key(key)
+
+        try:
+            _ORDERED_DICT.__delitem__(self, real_key)
+        except KeyError:
+            raise KeyError(repr(key))
+
+        if self._aliases:
+            self._aliases.pop(_lower_if_str(real_key), None)
+
+        self._changed()
+
+    def __contains__(self, key):
+        return _ORDERED_DICT.__contains__(self, self._real_key(key))
+
+    def has_key(self, key):
+        return key in self
+
+    def get(self, key, default=None):
+        return _ORDERED_DICT.get(self, self._real_key(key), default)
+
+    def pop(self, key, *args):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+
+        if args:
+            return args[0]
+
+        raise KeyError(repr(key))
+
+    def popitem(self):
+        key, value = _ORDERED_DICT.popitem(self)
+
+        if self._aliases:
+            self._aliases.pop(_lower_if_str(key), None)
+
+        self._changed()
+
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        if len(args) > 1:
+            raise TypeError(
+                "update expected at most 1 arguments, got %d" % len(args)
+            )
+
+        other = args[0] if args else ()
+        if hasattr(other, "keys"):
+            other = [(key, other[key]) for key in other.keys()]
+
+        for key, value in other:
+            self[key] = value
+
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        _ORDERED_DICT.clear(self)
+        self._aliases = None
+        self._changed()
+
+    def copy(self):
+        return self.__class__(self)
+
+    def __eq__(self, obj):
+        if self is obj:
+            return True
+
+        if not hasattr(obj, "__getitem__") or not hasattr(obj, "keys"):
+            return False
+
+        keys = list(obj.keys())
+        if len(self) != len(keys):
+            return False
+
+        for key in keys:
+            real_key = self._real_key(key)
+            if not _ORDERED_DICT.__contains__(self, real_key):
+                return False
+
+            if obj[key] != _ORDERED_DICT.__getitem__(self, real_key):
+                return False
+
+        return True
+
+    def __ne__(self, obj):
+        return not self.__eq__(obj)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()),)
+
+    # python 2 / 3 compatibility
+    if not hasattr(_ORDERED_DICT, "iteritems"):
+        def iteritems(self):
+            return iter(self.items())
+
+        def iterkeys(self):
+            return iter(self.keys())
+
+        def itervalues(self):
+            return iter(self.values())
+
+
+class _TrackedDict(dict):
+    """
+    Plain ``dict``, which counts its changes and reports them to the
+    :attr:`_owner`, same as :class:`CaseInsensitiveDict`.
+
+    It is used for the case sensitive :attr:`.HTMLElement.params` of the
+    elements, which report their changes to the parents.
+    """
+    __slots__ = ("_changes", "_owner")
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._changes = 0
+        self._owner = None
+
+    def _changed(self):
+        self._changes += 1
+
+        if self._owner is not None:
+            self._owner._changed(True)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._changed()
+
+    def pop(self, key, *args):
+        changed = key in self
+        value = dict.pop(self, key, *args)
+
+        if changed:
+            self._changed()
+
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._changed()
+
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        dict.clear(self)
+        self._changed()
+
+    def copy(self):
+        return self.__class__(self)
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
@@ -0,0 +1,364 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Tokenizer, which splits HTML into list of tags, comments and text.
+"""
+# Imports =====================================================================
+import re
+
+from .htmlelement.html_parser import _TAG
+from .htmlelement.html_parser import _END_TAG
+from .htmlelement.html_parser import _COMMENT
+from .htmlelement.html_parser import _NONPAIR
+
+
+# Variables ===================================================================
+_TAG_DELIMITERS = re.compile(r"""[<>"']""")
+
+# tag names, which are parsed same as by html_parser._parse_tag_name()
+_TAG_NAME = re.compile(r"<(/?)([^\s/<>]+)(?=/?(?:\s|>\Z))")
+
+
+# Functions & objects =========================================================
+class StateEnum(object):
+    _cnt = (x for x in range(100))
+
+    content = next(_cnt)
+    tag = next(_cnt)
+    parameter = next(_cnt)
+    comment = next(_cnt)
+
+
+def _find_closing_quote(itxt, quote, index):
+    """
+    Find the first `quote` in `itxt` from `index`, which is not escaped by
+    odd number of backslashes.
+
+    Args:
+        itxt (str): Text in which the quote is searched.
+        quote (char): Quote character (``'`` or ``"``).
+        index (int): Position from which the search starts.
+
+    Returns:
+        int: Index of the closing quote or -1 if not found.
+    """
+    end = itxt.find(quote, index)
+    while end >= 0:
+        backslash = end - 1
+        while itxt[backslash] == "\\":
+            backslash -= 1
+
+        if (end - backslash) % 2:  # even number of backslashes
+            return end
+
+        end = itxt.find(quote, end + 1)
+
+    return end
+
+
+class Tokenizer(object):
+    """
+    State machine, which splits HTML to tags, comments and text.
+
+    Source code is little bit unintutive, because it is state machine parser.
+    Instead of going thru the input char by char, it jumps between the
+    delimiters of each state using :meth:`str.find` and precompiled regular
+    expressions, so whole runs of text and tags are sliced at once.
+
+    For better understanding, look at http://bit.ly/1rXRcJj
+
+    Input may be given in chunks - state of the machine and the unfinished
+    token are kept between the calls of :meth:`feed`, so the chunks can be
+    split anywhere, even inside comments or quoted parameters.
+
+    Example::
+
+        >>> tokenizer = Tokenizer()
+        >>> tokenizer.feed('<html><tag para')
+        ['<html>']
+        >>> tokenizer.feed('ms="true"></html>')
+        ['<tag params="true">', '</html>']
+        >>> tokenizer.close()
+        []
+
+    If the `classify` is set, each token is returned as ``(token, flags,
+    tag_name)`` tuple, so the :class:`.HTMLElement` doesn't need to scan the
+    token again. `flags` are the ``_TAG``, ``_END_TAG``, ``_COMMENT`` and
+    ``_NONPAIR`` (for the tags ending with ``/>``) bits of the
+    :attr:`.HTMLElement._flags` (``0`` for text), or ``None``, if the token
+    couldn't be classified cheaply. `tag_name` is set only for tags::
+
+        >>> Tokenizer(classify=True).feed('<br/>text<!-- -->')
+        [('<br/>', 9, 'br'), ('text', 0, None), ('<!-- -->', 5, None)]
+
+    Args:
+        classify (bool, default False): Return tokens with their type.
+    """
+    def __init__(self, classify=False):
+        self.classify = classify
+
+        self._buffer = ""  # unprocessed input, starting with unfinished token
+        self._pending = []  # chunks, which weren't added to the `_buffer` yet
+        self._tail = ""  # last two characters of the input
+        self._index = 0  # position of the state machine in the `_buffer`
+        self._state = StateEnum.content
+        self._quote = ""
+        self._inside_tag = False
+
+    def feed(self, chunk):
+        """
+        Add `chunk` of the input and split it.
+
+        Args:
+            chunk (str): Next part of the HTML text.
+
+        Returns:
+            list: List of tokens finished by this `chunk`.
+        """
+        self._pending.append(chunk)
+        may_finish = self._may_finish(chunk)
+        self._tail = (self._tail + chunk[-2:])[-2:]
+
+        if not may_finish:
+            return []
+
+        return self._split(final=False)
+
+    def _may_finish(self, chunk):
+        """
+        Check whether the unfinished token may end in the `chunk`.
+
+        Long comments, quoted parameters and text may come in many chunks, so
+        they are joined only when their end may be there, not at each
+        :meth:`feed`.
+
+        Args:
+            chunk (str): Next part of the HTML text.
+
+        Returns:
+            bool: False if it is not worth to run the state machine.
+        """
+        state = self._state
+        if state == StateEnum.tag:
+            return True
+
+        if state == StateEnum.content:
+            return "<" in chunk
+
+        # delimiters may be split between the chunks
+        window = self._tail + chunk[:2]
+
+        if state == StateEnum.comment:
+            return "-->" in chunk or "-->" in window
+
+        if ">\n" in chunk or ">\n" in window:
+            return True
+
+        # skip the quotes escaped inside the `chunk`
+        quote = self._quote
+        end = chunk.find(quote)
+        while end >= 0:
+            backslash = end - 1
+            while backslash >= 0 and chunk[backslash] == "\\":
+                backslash -= 1
+
+            # backslashes from the previous chunk can't be counted here
+            if backslash < 0 or (end - backslash) % 2:
+                return True
+
+            end = chunk.find(quote, end + 1)
+
+        return False
+
+    def close(self):
+        """
+        Mark end of the input and return the rest of the tokens.
+
+        Returns:
+            list: List of tokens left in the buffer.
+        """
+        array = self._split(final=True)
+        self.__init__(self.classify)
+
+        return array
+
+    def _split(self, final):
+        """
+        Run the state machine over the :attr:`_buffer` and the chunks
+        waiting in the :attr:`_pending`.
+
+        Args:
+            final (bool): Set to True, if there is no more input. Otherwise,
+                  the state machine waits before decisions, which need more
+                  data and the unfinished token is kept in the buffer.
+
+        Returns:
+            list: List of strings (input splitted to tags and text), or \
+                  tuples, if :attr:`classify` is set.
+        """
+        classify = self.classify
+        itxt = self._buffer
+        if self._pending:
+            itxt += "".join(self._pending)
+            del self._pending[:]
+
+        index = self._index
+        next_state = self._state
+        quote = self._quote
+        inside_tag = self._inside_tag
+
+        array = []
+        start = 0  # beginning of the token which is being read
+        length = len(itxt)
+
+        while index < length:
+            # content
+            if next_state == StateEnum.content:
+                index = itxt.find("<", index)
+                if index < 0:
+                    index = length
+                    break
+
+                if index > start:
+                    if not classify:
+                        array.append(itxt[start:index])
+                    elif itxt[start] == "<":  # recovery from the parameter
+                        array.append((itxt[start:index], None, None))
+                    else:
+                        array.append((itxt[start:index], 0, None))
+
+                start = index
+                index += 1
+                inside_tag = False
+                next_state = StateEnum.tag
+
+            # html tag
+            elif next_state == StateEnum.tag:
+                # `<` was just read - check whether it opens a comment
+                if index == start + 1:
+                    if itxt.startswith("<!--", start):
+                        index += 3
+                        next_state = StateEnum.comment
+                        continue
+
+                    if not final and length - start < 4 and \
+                       "<!--".startswith(itxt[start:]):
+                        break
+
+                match = _TAG_DELIMITERS.search(itxt, index)
+                if not match:
+                    index = length
+                    break
+
+                index = match.start()
+                c = itxt[index]
+
+                if c == ">":
+                    index += 1
+                    if classify:
+                        array.append(self._classify_tag(itxt, start, index))
+                    else:
+                        array.append(itxt[start:index])
+                    start = index
+                    next_state = StateEnum.content
+
+                elif c == "'" or c == '"':
+                    quote = c
+                    index += 1
+                    next_state = StateEnum.parameter
+
+                else:  # jump back into tag instead of content
+                    if classify:
+                        array.append((itxt[start:index], None, None))
+                    else:
+                        array.append(itxt[start:index])
+                    start = index
+                    index += 1
+                    inside_tag = True
+
+            # quotes "" / ''
+            elif next_state == StateEnum.parameter:
+                end = _find_closing_quote(itxt, quote, index)
+
+                # unescaped end of line - this is good for invalid HTML like
+                # <a href=something">..., because it allows recovery
+                recovery = itxt.find(">\n", index, length if end < 0 else end)
+                if recovery >= 0:
+                    index = recovery + 2
+                    next_state = StateEnum.content
+                    inside_tag = False
+                elif end >= 0:
+                    index = end + 1
+                    next_state = StateEnum.tag
+                else:
+                    # last `>` may be followed by `\n` from the next chunk
+                    index = max(index, length - 1)
+                    break
+
+            # html comments
+            elif next_state == StateEnum.comment:
+                # `index` points behind the `<!--`, so the `--` may be shared
+                end = itxt.find("-->", index - 2)
+                if end < 0:
+                    index = length
+                    break
+
+                index = end + 3
+                if classify:
+                    array.append((itxt[start:index], _TAG | _COMMENT, None))
+                else:
+                    array.append(itxt[start:index])
+                start = index
+                next_state = StateEnum.tag if inside_tag else StateEnum.content
+                inside_tag = False
+
+        if final:
+            if start < length:
+                if classify:
+                    array.append((itxt[start:], None, None))
+                else:
+                    array.append(itxt[start:])
+
+            return array
+
+        self._buffer = itxt[start:]
+        self._index = index - start
+        self._state = next_state
+        self._quote = quote
+        self._inside_tag = inside_tag
+
+        return array
+
+    @staticmethod
+    def _classify_tag(itxt, start, end):
+        """
+        Classify token ``itxt[start:end]``, which ends with ``>``.
+
+        Args:
+            itxt (str): Buffer with the token.
+            start (int): Beginning of the token.
+            end (int): End of the token.
+
+        Returns:
+            tuple: ``(token, flags, tag_name)``, see :class:`Tokenizer`.
+        """
+        token = itxt[start:end]
+
+        # text behind the comment inside the tag
+        if itxt[start] != "<":
+            return (token, 0, None)
+
+        match = _TAG_NAME.match(itxt, start, end)
+        if not match:
+            return (token, None, None)
+
+        flags = _TAG
+        if match.group(1):
+            flags |= _END_TAG
+        if itxt[end - 2] == "/":
+            flags |= _NONPAIR
+
+        return (token, flags, match.group(2))
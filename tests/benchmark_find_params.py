@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+"""
+Benchmark of the ``find(..., params=...)`` with the :class:`.SpecialDict` and
+:class:`.CaseInsensitiveDict` used as :attr:`.HTMLElement.params`.
+
+Run it from the root of the repository::
+
+    PYTHONPATH=src python tests/benchmark_find_params.py
+"""
+# Imports =====================================================================
+from __future__ import print_function
+
+import timeit
+
+import dhtmlparser
+from dhtmlparser.specialdict import SpecialDict
+from dhtmlparser.specialdict import CaseInsensitiveDict
+
+
+# Variables ===================================================================
+ROW = (
+    '<tr class="row"><td id="c1" Class="cell">cell <b>bold</b></td>'
+    '<td><a href="/x?id=1" title="link">link</a><br /></td></tr>\n'
+)
+PAGE = "<html><body><table>\n" + ROW * 2000 + "</table></body></html>"
+
+QUERIES = [
+    ("td", {"class": "cell"}),
+    ("", {"id": "c1"}),
+    ("a", {"HREF": "/x?id=1", "title": "link"}),
+    ("div", {"id": "missing"}),
+]
+
+
+# Functions & objects =========================================================
+def _all_elements(dom):
+    stack = [dom]
+    while stack:
+        el = stack.pop()
+        yield el
+        stack.extend(el.childs)
+
+
+def dom_with_params(params_type):
+    """
+    Parse the :attr:`PAGE` and convert params of all tags to `params_type`.
+    """
+    dom = dhtmlparser.parseString(PAGE)
+
+    for el in _all_elements(dom):
+        if el.isTag() and not el.isComment() and not el.isEndTag():
+            el.params = params_type(el.params)
+
+    return dom
+
+
+def run_queries(dom):
+    return [len(dom.find(tag_name, params)) for tag_name, params in QUERIES]
+
+
+def benchmark(params_type, repeat=5, number=3):
+    dom = dom_with_params(params_type)
+
+    return min(
+        timeit.repeat(lambda: run_queries(dom), repeat=repeat, number=number)
+    )
+
+
+# Main program ================================================================
+if __name__ == '__main__':
+    assert run_queries(dom_with_params(SpecialDict)) == \
+        run_queries(dom_with_params(CaseInsensitiveDict))
+
+    old = benchmark(SpecialDict)
+    new = benchmark(CaseInsensitiveDict)
+
+    print("SpecialDict:         %.3fs" % old)
+    print("CaseInsensitiveDict: %.3fs" % new)
+    print("speed-up:            %.2fx" % (old / new))
@@ -4,6 +4,8 @@
 # Interpreter version: python 2.7
 #
 # Imports =====================================================================
+import re
+
 import dhtmlparser
 from dhtmlparser import first
 
@@ -102,6 +104,39 @@ def test_findB():
     assert dom.findB("div")[1].getContent().strip() == "Second."
 
 
+def test_findB_doesnt_change_dom():
+    dom = dhtmlparser.parseString(
+        "<div id=1><div id=2><p>x</p></div></div><div id=3><p>y</p></div>"
+    )
+    original = dom.toString()
+    childs = len(dom.childs)
+
+    for _ in range(3):
+        assert [el.params["id"] for el in dom.findB("div")] == ["1", "3", "2"]
+
+    assert len(dom.childs) == childs
+    assert dom.toString() == original
+
+
+def test_findB_max_depth():
+    dom = dhtmlparser.parseString(
+        "<div id=1><div id=2><p>x</p></div></div><div id=3><p>y</p></div>"
+    )
+
+    assert [el.params["id"] for el in dom.findB("div", max_depth=1)] == [
+        "1", "3"
+    ]
+    assert [el.getContent() for el in dom.findB("p", max_depth=2)] == ["y"]
+    assert len(dom.findB("p", max_depth=3)) == 2
+    assert len(dom.findAllB("p", max_depth=3)) == 4
+    assert dom.findB("p", max_depth=0) == []
+
+    iterator = dom.iterFindB("div", max_depth=1)
+    assert next(iterator).params["id"] == "1"
+    assert next(iterator).params["id"] == "3"
+    assert next(iterator, None) is None
+
+
 def test_wfind():
     dom = dhtmlparser.parseString(
         """
@@ -284,3 +319,263 @@ def test_match_parameters_relative_path():
     )
 
     assert not xe
+
+
+def test_match_nested_paths():
+    dom = dhtmlparser.parseString(
+        """
+        <root>
+            <div id="1">
+                <p><xe id="a" /></p>
+                <div id="2"><xe id="b" /></div>
+            </div>
+            <xe id="c" />
+        </root>
+        """
+    )
+
+    # <xe id="b"> is reached through both divs
+    xe = dom.match("div", "xe")
+    assert [el.params["id"] for el in xe] == ["a", "b", "b"]
+
+    # elements may match several subsequent steps
+    divs = dom.match("div", "div")
+    assert [el.params["id"] for el in divs] == ["1", "2", "2"]
+
+    xe = dom.match("root", "xe", absolute=True)
+    assert [el.params["id"] for el in xe] == ["c"]
+
+    xe = dom.wfind("root").match("div", "div", "xe")
+    assert [el.params["id"] for el in xe] == ["b"]
+
+    assert dom.match("root", "nothing", "xe") == []
+
+
+def test_find_index():
+    options = dhtmlparser.ParserOptions(build_index=True)
+    dom = dhtmlparser.parseString(
+        """
+        <div id=1><A href="x">a</A><p>text <a>a</a></p></div>
+        <div id=2><br>a</div>
+        """,
+        options=options
+    )
+
+    assert dom._index.isValid()
+    assert [x.tagToString() for x in dom._index.tags["a"]] == [
+        '<A href="x">', "a", "</A>", "<a>", "a", "</a>", "a",
+    ]
+
+    def without_index(*args, **kwargs):
+        return dhtmlparser.HTMLElement(dom.childs).findAll(*args, **kwargs)
+
+    for args in [("a",), ("A",), ("div", {"id": "2"}), ("br",), ("xx",),
+                 ("a", None, None, True), ("", {"id": "1"})]:
+        assert dom.findAll(*args) == without_index(*args)
+
+    assert len(dom.find("a")) == 5
+
+    # tracked changes invalidate the index
+    div = dom.find("div")[0]
+    div.removeChild(div.find("p")[0])
+
+    assert not dom._index.isValid()
+    assert len(dom.find("a")) == 3
+    assert dom._index.isValid()
+
+    dom.find("br")[0].replaceWith(dhtmlparser.HTMLElement("<a />"))
+    assert len(dom.find("a")) == 4
+    assert dom.find("a")[2].isNonPairTag()
+    assert dom.find("br") == []
+
+    # direct changes of the childs are tracked too
+    dom.childs.append(dhtmlparser.HTMLElement("<br>"))
+    assert len(dom.find("br")) == 1
+
+    dom.find("div")[0].childs.append(dhtmlparser.HTMLElement("<b>"))
+    assert len(dom.find("b")) == 1
+
+    # changes of the other documents keep the index
+    other = dhtmlparser.parseString("<b>", options=options)
+    other.childs.pop()
+    assert dom._index.isValid()
+
+
+def test_get_element_by_id_and_class_name():
+    html = """
+        <div ID="price" class="box big">10</div>
+        <p class="big">text <span class='x big box'>y</span></p>
+        <div id="other" class="small">
+    """
+    options = dhtmlparser.ParserOptions(build_index=True)
+    dom = dhtmlparser.parseString(html, options=options)
+    plain = dhtmlparser.parseString(html)
+
+    assert dom._index.ids == {
+        "price": [dom.childs[1]],
+        "other": [dom.childs[7]],
+    }
+    assert sorted(dom._index.classes) == ["big", "box", "small", "x"]
+
+    for root in [dom, plain]:
+        assert root.getElementById("price").getContent() == "10"
+        assert root.getElementById("PRICE") is None
+        assert root.getElementById("other").params["class"] == "small"
+
+        assert len(root.getElementsByClassName("big")) == 3
+        assert [el.getTagName() for el in
+                root.getElementsByClassName(" box  big ")] == ["div", "span"]
+        assert root.getElementsByClassName("big other") == []
+        assert root.getElementsByClassName("") == []
+
+        assert root.find("", {"id": "price"}) == [root.childs[1]]
+
+    # changes of the DOM
+    dom.removeChild(dom.getElementById("price"))
+    assert dom.getElementById("price") is None
+    assert len(dom.getElementsByClassName("big")) == 2
+
+    span = dom.getElementsByClassName("x")[0]
+    span.params = {"id": "price"}
+    assert dom.getElementById("price") is span
+    assert dom.getElementsByClassName("x") == []
+
+    # in-place changes are tracked too
+    span.params["id"] = "new"
+    assert dom.getElementById("price") is None
+    assert dom.getElementById("new") is span
+
+    other = dom.getElementById("other")
+    other.params["id"] = "price"
+    other.params["class"] = "hot"
+    assert dom._index.isValid()  # only ids and classes are collected again
+
+    assert dom.getElementById("other") is None
+    assert dom.getElementById("price") is other
+    assert dom.find("", {"id": "price"}) == [other]
+    assert dom.getElementsByClassName("hot") == [other]
+    assert dom.getElementsByClassName("small") == []
+
+    del other.params["class"]
+    assert dom.getElementsByClassName("hot") == []
+
+    # parameters of the tags without `id` and `class` are not parsed
+    dom = dhtmlparser.parseString(
+        "<img width=1 hidden data-idx=2 subclass='a'>"
+        "<a x='1'id=y><b c=1 CLASS>",
+        options=options
+    )
+    img, a, b = dom.childs[:3]
+
+    assert img._params is None
+    assert dom.getElementById("y") is a
+    assert b.params == {"c": "1", "class": ""}
+    assert a._params is not None and b._params is not None
+
+
+def test_iter_find_and_limit():
+    dom = dhtmlparser.parseString(
+        "<div><h1>a</h1><p>x</p></div><h1>b</h1><p><h1 id=c>c</h1></p>"
+    )
+
+    iterator = dom.iterFind("h1")
+    assert next(iterator).getContent() == "a"
+    assert next(iterator).getContent() == "b"
+
+    assert [el.tagToString() for el in dom.iterFindAll("h1")][:3] == [
+        "<h1>", "</h1>", "<h1>",
+    ]
+
+    assert dom.findFirst("h1").getContent() == "a"
+    assert dom.findFirst("h1", {"id": "c"}).getContent() == "c"
+    assert dom.findFirst("form") is None
+
+    visited = []
+
+    def fn(el):
+        visited.append(el)
+        return True
+
+    assert len(dom.find("", fn=fn, limit=2)) == 2
+    assert len(visited) == 2
+
+    assert [el.getContent() for el in dom.find("h1", limit=2)] == ["a", "b"]
+    assert len(dom.findAll("h1", limit=2)) == 2
+    assert dom.find("h1", limit=0) == []
+    assert len(dom.find("h1", limit=10)) == 3
+
+    assert [el.getContent() for el in dom.findB("h1", limit=2)] == ["b", "a"]
+    assert len(dom.findAllB("h1", limit=1)) == 1
+
+
+def test_matcher():
+    dom = dhtmlparser.parseString(
+        """
+        <h1>Title</h1>
+        <table><tr><th>a</th><td>b</td></tr></table>
+        <a href="x.pdf">pdf</a> <a href="x.html">html</a> <A HREF="y.PDF">
+        <H2 class="sub">Sub</H2>
+        """
+    )
+
+    headings = dhtmlparser.Matcher(re.compile("h[1-6]"))
+    assert [el.getContent() for el in dom.find(headings)] == ["Title", "Sub"]
+
+    case_sensitive = dhtmlparser.Matcher(re.compile("h\\d"), case_sensitive=1)
+    assert [el.getContent() for el in dom.find(case_sensitive)] == ["Title"]
+
+    cells = dhtmlparser.Matcher({"TD", "th"})
+    assert [el.getContent() for el in dom.find(cells)] == ["a", "b"]
+
+    pdf = dhtmlparser.Matcher("a", {"href": re.compile(r"\.pdf$", re.I)})
+    assert [el.params["href"] for el in dom.find(pdf)] == ["x.pdf", "y.PDF"]
+    assert dom.findFirst(pdf).getContent() == "pdf"
+    assert len(dom.findB(pdf)) == 2
+
+    links = dom.find("a", fn=lambda el: el.isTag())
+    assert pdf(links[0])
+    assert not pdf(links[1])
+    assert links[0].isAlmostEqual(pdf)
+
+    sub = dhtmlparser.Matcher("h2", {"class": "sub"}, lambda el: el.childs)
+    assert dom.find(sub) == dom.find("h2")
+
+    assert dom.wfind(cells).childs == []
+    assert len(dom.match("table", "tr", cells)) == 2
+
+
+def test_find_many():
+    dom = dhtmlparser.parseString(
+        """
+        <h1>Title</h1>
+        <a href="/" rel="nofollow">home</a> <A href="/about">about</A>
+        <span id="price">10</span> <span>x</span>
+        """
+    )
+
+    queries = {
+        "title": "h1",
+        "links": ("a", {"rel": "nofollow"}),
+        "all_links": "A",
+        "price": {"tag_name": "span", "params": {"id": "price"}},
+        "case": ("a", None, None, True),
+        "text": ("", None, lambda el: el.getTagName() == "x"),
+        "headings": dhtmlparser.Matcher(re.compile("h[1-6]")),
+        "missing": "table",
+    }
+    result = dom.findMany(queries)
+
+    assert sorted(result) == sorted(queries)
+    for key, query in queries.items():
+        if isinstance(query, dict):
+            assert result[key] == dom.find(**query)
+        elif isinstance(query, tuple):
+            assert result[key] == dom.find(*query)
+        else:
+            assert result[key] == dom.find(query)
+
+    assert [el.getContent() for el in result["all_links"]] == [
+        "home", "about"
+    ]
+    assert result["price"][0].getContent() == "10"
+    assert result["missing"] == []
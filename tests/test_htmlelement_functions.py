@@ -44,3 +44,81 @@ def test_closeElements():
     xe = tag.find("xe")
     assert xe
     assert first(xe).endtag
+
+
+def test_slots():
+    e = dhtmlparser.HTMLElement("<div>")
+
+    assert not e.__dict__  # __dict__ is created only for custom attributes
+
+    e.custom = 1
+    assert e.custom == 1
+
+
+def test_lightweight_elements():
+    dom = dhtmlparser.parseString("<div>text<!-- comment --></div>")
+    div = first(dom.find("div"))
+
+    text, comment = div.childs
+    assert isinstance(text, dhtmlparser.TextElement)
+    assert isinstance(comment, dhtmlparser.CommentElement)
+    assert isinstance(div.endtag, dhtmlparser.EndTagElement)
+
+    assert not text.isTag()
+    assert comment.isComment()
+    assert div.endtag.isEndTag()
+    assert div.endtag.getTagName() == "div"
+
+    # empty params and childs are shared and can't be changed
+    assert text.params is comment.params
+    assert not text.childs
+
+    try:
+        text.params["key"] = "value"
+        assert False, "TypeError expected"
+    except TypeError:
+        pass
+
+    assert dom.find("div", fn=lambda x: True)
+    assert dhtmlparser.removeTags(dom) == "text"
+    assert dom.toString() == "<div>text<!-- comment --></div>"
+
+
+def test_lazy_params():
+    dom = dhtmlparser.parseString(
+        """<div id="x" class="y">c</div><a href='x'>b</a><img src="i">"""
+    )
+    div, a, img = dom.find("div") + dom.find("a") + dom.find("img")
+
+    assert div._params is None
+
+    # canonical tags are serialized without parsing
+    assert div.tagToString() == '<div id="x" class="y">'
+    assert div._params is None
+
+    assert a.tagToString() == '<a href="x">'
+    assert img.tagToString() == '<img src="i" />'
+
+    assert div.params == {"id": "x", "class": "y"}
+    assert div._params is not None
+
+    # `/` parameter is parsed immediately, because it makes tag nonpair
+    e = dhtmlparser.HTMLElement('<xe a="b" / >')
+    assert e._params is not None
+    assert e.isNonPairTag()
+    assert e.params == {"a": "b"}
+
+
+def test_interned_tag_keys():
+    dom = dhtmlparser.parseString(
+        '<div class="a">x</div><DIV class="b">y</DIV><div class="c"></div>'
+    )
+    first_div, upper_div, last_div = dom.find("div")
+
+    assert first_div.getTagName() is last_div.getTagName()
+    assert upper_div.getTagName() == "DIV"
+    assert first_div._tagkey is upper_div._tagkey is upper_div.endtag._tagkey
+
+    first_key = list(first_div.params.keys())[0]
+    last_key = list(last_div.params.keys())[0]
+    assert first_key is last_key
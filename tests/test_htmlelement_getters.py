@@ -97,6 +97,46 @@ def test_toString():
     assert br.toString() == "<br />"
 
 
+def test_iterString_and_write():
+    assert "".join(DOM.iterString()) == DOM.toString()
+    assert list(br.iterString()) == ["<br />"]
+
+    pieces = []
+
+    class Writer(object):
+        def write(self, piece):
+            pieces.append(piece)
+
+    div.write(Writer())
+    assert "".join(pieces) == div.toString()
+
+    deep = dhtmlparser.parseString("<b>" * 5000 + "x" + "</b>" * 5000)
+    assert deep.toString() == "<b>" * 5000 + "x" + "</b>" * 5000
+
+
+def test_prettify():
+    dom = dhtmlparser.parseString(
+        "<div><p>text <b>bold</b></p>\n<ul><li>a</li></ul>"
+        "<pre>x\n  <i>y</i></pre><br></div>"
+    )
+
+    assert dom.prettify() == (
+        "<div>\n"
+        "  <p>text <b>bold</b></p>\n"
+        "  <ul>\n"
+        "    <li>a</li>\n"
+        "  </ul>\n"
+        "  <pre>x\n"
+        "  <i>y</i></pre>\n"
+        "  <br>\n"
+        "</div>\n"
+    )
+    assert "".join(dom.iterPrettify()) == dom.prettify()
+
+    deep = dhtmlparser.parseString("<b>" * 5000 + "</b>" * 5000)
+    assert deep.prettify().count("\n") == 10000
+
+
 def test_isNonPairTag_setter():
     div.isNonPairTag(True)
 
@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Interpreter version: python 2.7
+#
+# Imports =====================================================================
+import pytest
+
+import dhtmlparser
+from dhtmlparser.htmlelement import html_selector
+
+
+# Variables ===================================================================
+HTML = """
+<ul id="menu">
+    <li><a href="/">Home</a></li>
+    <li class="active first"><a href="/about" lang="en-US">About</a></li>
+    <li><a href="http://example.com/contact">Contact</a></li>
+</ul>
+<p>a</p><span>x</span><p class="note">b</p><p>c</p>
+"""
+
+
+# Functions & objects =========================================================
+@pytest.fixture(params=[False, True], ids=["walk", "index"])
+def dom(request):
+    options = dhtmlparser.ParserOptions(build_index=request.param)
+    return dhtmlparser.parseString(HTML, options=options)
+
+
+def contents(elements):
+    return [el.getContent() for el in elements]
+
+
+def test_select(dom):
+    assert contents(dom.select("a")) == ["Home", "About", "Contact"]
+    assert contents(dom.select("#menu > li.active a")) == ["About"]
+    assert contents(dom.select("ul a[href^='/']")) == ["Home", "About"]
+    assert contents(dom.select("a[href$=contact]")) == ["Contact"]
+    assert contents(dom.select("a[href*=example]")) == ["Contact"]
+    assert contents(dom.select("[lang|=en]")) == ["About"]
+    assert contents(dom.select("li[class~=first] > *")) == ["About"]
+    assert contents(dom.select(".active.first a")) == ["About"]
+    assert contents(dom.select("LI:nth-child(2n+1) a")) == ["Home", "Contact"]
+    assert contents(dom.select("li:nth-last-child(1) a")) == ["Contact"]
+    assert contents(dom.select("li:first-child a")) == ["Home"]
+    assert contents(dom.select("p + p")) == ["c"]
+    assert contents(dom.select("span ~ p")) == ["b", "c"]
+    assert contents(dom.select("p.note, li a:last-child")) == [
+        "Home", "About", "Contact", "b"
+    ]
+
+    assert dom.select("ul > a") == []
+    assert dom.select("div, #missing") == []
+
+
+def test_select_one(dom):
+    assert dom.select_one("li:nth-child(even) a").getContent() == "About"
+    assert dom.select_one("li ~ li a").getContent() == "About"
+    assert dom.select_one("table") is None
+
+
+def test_select_in_subelement(dom):
+    menu = dom.select_one("#menu")
+
+    assert contents(menu.select("ul a")) == ["Home", "About", "Contact"]
+    assert menu.select("ul") == []
+    assert menu.select("p") == []
+
+
+def test_select_after_changes(dom):
+    dom.removeChild(dom.select_one("li.active"))
+    assert contents(dom.select("li > a")) == ["Home", "Contact"]
+    assert contents(dom.select("li:last-child a")) == ["Contact"]
+
+    dom.select_one("span").params = {"class": "note"}
+    assert contents(dom.select(".note")) == ["x", "b"]
+
+    # in-place changes
+    li = dom.select_one("li")
+    li.params["id"] = "home"
+    li.params["class"] = "active"
+    assert contents(dom.select("#home > a")) == ["Home"]
+    assert contents(dom.select(".active a")) == ["Home"]
+
+    del dom.select_one("#menu").params["id"]
+    assert dom.select("#menu li") == []
+
+    li.childs.append(dhtmlparser.HTMLElement("<a>", [
+        dhtmlparser.HTMLElement("Top")
+    ]))
+    assert contents(dom.select(".active a")) == ["Home", "Top"]
+
+
+def test_invalid_selectors():
+    dom = dhtmlparser.parseString(HTML)
+
+    for css in ["", "a >", ", a", "a,,b", "a:hover", "a[href", "#", "*a",
+                ":nth-child(x)"]:
+        with pytest.raises(ValueError):
+            dom.select(css)
+
+
+def test_selector_cache():
+    html_selector._CACHE.clear()
+
+    selector = html_selector.compile_selector("div > p")
+    assert html_selector.compile_selector("div > p") is selector
+
+    for i in range(html_selector._CACHE_LIMIT):
+        html_selector.compile_selector("p%d" % i)
+
+    assert len(html_selector._CACHE) == html_selector._CACHE_LIMIT
+    assert html_selector.compile_selector("div > p") is not selector
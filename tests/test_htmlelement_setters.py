@@ -28,6 +28,24 @@ def test_replaceWith():
     assert dom.getContent() == "<div><another /></div>"
 
 
+def test_replaceWith_lightweight_element():
+    dom = dhtmlparser.parseString("<div><p>text</p></div>")
+    div = first(dom.find("div"))
+    text = first(dom.find("p")).childs[0]
+
+    div.replaceWith(text)
+    assert dom.getContent() == "text"
+
+    # params and childs of the lightweight elements are shared and immutable
+    div.params["a"] = "b"
+    div.childs.append(dhtmlparser.HTMLElement("<br />"))
+
+    assert div.params == {"a": "b"}
+    assert len(div.childs) == 1
+    assert not text.params
+    assert not text.childs
+
+
 def test_removeChild():
     dom.removeChild(
         dom.find("another")
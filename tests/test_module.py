@@ -4,6 +4,11 @@
 # Interpreter version: python 2.7
 #
 # Imports =====================================================================
+import gc
+import io
+import pickle
+import threading
+
 import pytest
 
 import dhtmlparser
@@ -73,6 +78,36 @@ def test_raw_split_comments():
     assert splitted[2] == "</html>"
 
 
+def test_raw_split_recovery():
+    splitted = dhtmlparser._raw_split(
+        """<a href=x">text</a>\n<b>"""
+    )
+
+    assert splitted == ['<a href=x">text</a>\n', "<b>"]
+
+    assert dhtmlparser._raw_split("<a <b>") == ["<a ", "<b>"]
+    assert dhtmlparser._raw_split("a < b") == ["a ", "< b"]
+    assert dhtmlparser._raw_split("<!-- x") == ["<!-- x"]
+    assert dhtmlparser._raw_split("<!---->") == ["<!---->"]
+
+
+def test_raw_split_classify():
+    splitted = dhtmlparser._raw_split(
+        """<HTML a="b">text<br/><!-- x --></html><a <x/y>""",
+        classify=True
+    )
+
+    assert splitted == [
+        ('<HTML a="b">', 1, "HTML"),
+        ("text", 0, None),
+        ("<br/>", 9, "br"),
+        ("<!-- x -->", 5, None),
+        ("</html>", 3, "html"),
+        ("<a ", None, None),  # unknown - parsed by HTMLElement
+        ("<x/y>", None, None),
+    ]
+
+
 def test_index_of_end_tag():
     tag_list = [
         dhtmlparser.HTMLElement("<h1>"),
@@ -122,6 +157,27 @@ def test_parse_dom():
     assert dom[1].isEndTagTo(dom[0])
 
 
+def test_parse_dom_unclosed():
+    tag_list = [
+        dhtmlparser.HTMLElement("<x>"),
+        dhtmlparser.HTMLElement("<y>"),
+        dhtmlparser.HTMLElement("<x>"),
+        dhtmlparser.HTMLElement("</y>"),
+        dhtmlparser.HTMLElement("</x>"),
+    ]
+
+    dom = dhtmlparser._parseDOM(tag_list)
+
+    assert len(dom) == 3
+    assert dom[0].isNonPairTag()
+    assert not dom[0].childs
+
+    assert dom[1].getTagName() == "y"
+    assert dom[1].endtag is dom[2]
+    assert len(dom[1].childs) == 1
+    assert dom[1].childs[0].isNonPairTag()
+
+
 def test_parseString():
     dom = dhtmlparser.parseString(
         """<html><tag PARAM="true"></html>"""
@@ -147,6 +203,46 @@ def test_parseString():
     assert dom.childs[0].childs[0].params["param"] == "true"
 
 
+def test_incremental_parser():
+    inp = """<html><!-- asd " asd" > asd --><tag params="some \\"<quoted>\\" text">
+<invalid tag=something">not properly started</invalid>
+<a href="x">link</a></html>"""
+
+    for size in range(1, 10):
+        parser = dhtmlparser.IncrementalParser()
+        for i in range(0, len(inp), size):
+            parser.feed(inp[i:i + size])
+
+        dom = parser.close()
+
+        assert dom.__str__() == dhtmlparser.parseString(inp).__str__()
+        assert first(dom.find("a")).params["href"] == "x"
+
+
+def test_incremental_parser_long_tokens():
+    parser = dhtmlparser.IncrementalParser()
+    parser.feed('<a title="')
+    for _ in range(100):
+        parser.feed("-> \\\" '")
+
+        # unfinished token is joined only when it may end
+        assert len(parser._tokenizer._buffer) < 20
+
+    parser.feed('"><!--')
+    for _ in range(100):
+        parser.feed(' > " -')
+
+        assert len(parser._tokenizer._buffer) < 20
+
+    parser.feed("-></a>")
+    dom = parser.close()
+
+    a = first(dom.find("a"))
+    assert a.params["title"] == "-> \" '" * 100
+    assert a.childs[0].isComment()
+    assert str(a.childs[0]) == "<!--" + ' > " -' * 100 + "->"
+
+
 def test_parseString_cip():
     dom = dhtmlparser.parseString(
         """<html><tag PARAM="true"></html>""",
@@ -178,6 +274,459 @@ def test_parseString_cip():
         dom.childs[0].childs[0].params["param"]
 
 
+def test_parser_options():
+    xml = dhtmlparser.ParserOptions(cip=False, nonpair_tags=[])
+
+    dom = dhtmlparser.parseString('<Item ID="1"><br>text</br></Item>',
+                                  options=xml)
+    br = dom.find("br")[0]
+
+    assert not br.isNonPairTag()
+    assert br.getContent() == "text"
+    assert "id" not in dom.find("item")[0].params
+
+    # options of the previous parse don't leak to the next one
+    dom = dhtmlparser.parseString('<Item ID="1"><br>text</br></Item>')
+
+    assert dom.find("br")[0].isNonPairTag()
+    assert "id" in dom.find("item")[0].params
+
+
+def test_cache_strings():
+    options = dhtmlparser.ParserOptions(cache_strings=True)
+    dom = dhtmlparser.parseString(
+        '<div id="1"><p>a</p><p class="x">b</p></div><br>',
+        options=options
+    )
+    div = dom.find("div")[0]
+    p = dom.find("p")[1]
+
+    assert str(dom) == '<div id="1"><p>a</p><p class="x">b</p></div><br>'
+    assert dom.toString() is dom.toString()
+
+    # changes are reported to the parents
+    p.params["class"] = "y"
+    assert p.tagToString() == '<p class="y">'
+    assert div.toString() == '<div id="1"><p>a</p><p class="y">b</p></div>'
+    assert str(dom) == '<div id="1"><p>a</p><p class="y">b</p></div><br>'
+
+    p.childs.append(dhtmlparser.HTMLElement("<i>"))
+    assert str(dom) == '<div id="1"><p>a</p><p class="y">b<i></p></div><br>'
+
+    p.childs[-1].params["x"] = "1"
+    p.childs = p.childs[:1]
+    assert str(dom) == '<div id="1"><p>a</p><p class="y">b</p></div><br>'
+
+    # changes of the other documents don't invalidate the cache
+    output = dom.toString()
+    other = dhtmlparser.parseString("<p>x</p>", options=options)
+    other.find("p")[0].params["id"] = "z"
+    other.childs.append(dhtmlparser.HTMLElement("<b>"))
+    assert dom.toString() is output
+
+    div.removeChild(dom.find("p")[0])
+    assert div.getContent() == '<p class="y">b</p>'
+    assert str(dom) == '<div id="1"><p class="y">b</p></div><br>'
+    assert str(dhtmlparser.HTMLElement(div.childs)) == '<p class="y">b</p>'
+
+    p.isNonPairTag(True)
+    assert str(dom) == '<div id="1"><p class="y" /></div><br>'
+
+    # changes of the endtags are reported through their openers
+    for opts in [options, dhtmlparser.ParserOptions(keep_source=True)]:
+        dom = dhtmlparser.parseString("<div><p>x</p></div>", options=opts)
+        dom.find("p")[0].childs.append(
+            dhtmlparser.HTMLElement("a", {}, [dhtmlparser.HTMLElement("y")])
+        )
+        assert str(dom) == "<div><p>x<a>y</a></p></div>"
+
+        dom.find("a")[0].endtag.replaceWith(dhtmlparser.HTMLElement("</b>"))
+        assert str(dom) == "<div><p>x<a>y</b></p></div>"
+
+        dom.find("p")[0].endtag.replaceWith(dhtmlparser.HTMLElement("</i>"))
+        assert str(dom) == "<div><p>x<a>y</b></i></div>"
+
+    # elements are serialized while they are still parsed
+    parser = dhtmlparser.IterParser(
+        ["<a><b>x</b", "><c></a>"],
+        options=options
+    )
+    for event, el in parser:
+        el.toString()
+
+    assert str(parser.root) == "<a><b>x</b><c></a>"
+
+
+def test_keep_source():
+    options = dhtmlparser.ParserOptions(keep_source=True)
+    inp = "<div ID=1>\n  <p class='x'>a</b></p>\n  <img src=y>\n</div>"
+
+    dom = dhtmlparser.parseString(inp, options=options)
+    p = dom.find("p")[0]
+    img = dom.find("img")[0]
+
+    assert str(dom) == inp
+    assert p.toString() == "<p class='x'>a</b></p>"
+    assert p.getSpan() == (13, 35)
+    assert p.getPosition() == (2, 3)
+    assert img.getPosition() == (3, 3)
+    assert dom.getPosition() == (1, 1)
+
+    # changed elements and their parents are serialized from the elements
+    p.params = {"class": "y"}
+    assert p.toString() == '<p class="y">a</p>'
+    assert img.toString() == "<img src=y>"
+    assert str(dom) == (
+        '<div ID="1">\n  <p class="y">a</p>\n  <img src=y>\n</div>'
+    )
+    assert p.getPosition() == (2, 3)
+
+    dom = dhtmlparser.parseString(inp, options=options)
+    dom.find("div")[0].params["id"] = "b"
+    assert str(dom) == inp.replace("ID=1", 'id="b"')
+    assert dom.find("p")[0].toString() == "<p class='x'>a</b></p>"
+
+    dom = dhtmlparser.parseString(inp, options=options)
+    dom.find("p")[0].childs.append(dhtmlparser.HTMLElement("<i>"))
+    assert str(dom) == (
+        '<div ID="1">\n  <p class="x">a<i></p>\n  <img src=y>\n</div>'
+    )
+
+    # changes of the other documents don't switch the slicing off
+    dom = dhtmlparser.parseString(inp, options=options)
+    other = dhtmlparser.parseString(inp, options=options)
+    other.find("p")[0].params["class"] = "y"
+    other.removeChild(other.find("img")[0])
+    assert str(dom) == inp
+
+    parser = dhtmlparser.IncrementalParser(options=options)
+    for char in inp:
+        parser.feed(char)
+
+    dom = parser.close()
+    assert str(dom) == inp
+    assert dom.find("p")[0].getSpan() == (13, 35)
+
+    assert dhtmlparser.parseString(inp).find("p")[0].getSpan() is None
+
+    inp = "<root><item>1</item><other /></root>"
+    parser = dhtmlparser.IterParser(inp, events=("end",), options=options)
+    for event, el in parser:
+        if el.getTagName() == "item":
+            parser.detach(el)
+
+    assert parser.root.__str__() == "<root><other /></root>"
+    assert parser.root.find("other")[0].getSpan() == (20, 29)
+
+    # detached elements are not kept in the source text
+    assert not parser._source.text
+    assert parser.root.find("other")[0].getPosition() is None
+
+    # end tags are serialized by their openers
+    inp = "<p><a href=x>link</a></p>"
+    endtag = dhtmlparser.parseString(inp, options=options).find("a")[0].endtag
+    assert endtag.toString() == ""
+    assert endtag.toString() == \
+        dhtmlparser.parseString(inp).find("a")[0].endtag.toString()
+
+
+def test_keep_source_replace_with():
+    options = dhtmlparser.ParserOptions(keep_source=True)
+    dom = dhtmlparser.parseString("<div><img src=y>abc</div>", options=options)
+    img = dom.find("img")[0]
+
+    p = dhtmlparser.parseString("<p>x</p>").find("p")[0]
+    p.replaceWith(img)
+
+    assert str(p) == '<img src="y" />'
+    assert p.getSpan() is None
+
+    # the params are copied, the source text of the `img` is still valid
+    p.params["src"] = "z"
+    assert str(p) == '<img src="z" />'
+    assert img.toString() == "<img src=y>"
+    assert str(dom) == "<div><img src=y>abc</div>"
+
+
+def test_cache_strings_replace_with():
+    for cip in [True, False]:
+        options = dhtmlparser.ParserOptions(cip=cip, cache_strings=True)
+        dom = dhtmlparser.parseString(
+            "<div><a href=x>1</a><b id=y>2</b></div>",
+            options=options
+        )
+        a = dom.find("a")[0]
+        b = dom.find("b")[0]
+
+        a.replaceWith(b)
+        assert str(dom) == '<div><b id="y">2</b><b id="y">2</b></div>'
+
+        b.params["id"] = "z"
+        assert a.toString() == '<b id="y">2</b>'
+        assert b.toString() == '<b id="z">2</b>'
+        assert str(dom) == '<div><b id="y">2</b><b id="z">2</b></div>'
+
+        a.params["id"] = "w"
+        assert a.toString() == '<b id="w">2</b>'
+        assert b.toString() == '<b id="z">2</b>'
+        assert str(dom) == '<div><b id="w">2</b><b id="z">2</b></div>'
+
+
+def test_pickle():
+    inp = "<div id=a><p class='x'>text</p><br></div>"
+    options = dhtmlparser.ParserOptions(
+        build_index=True,
+        cache_strings=True,
+        keep_source=True,
+    )
+
+    for protocol in [0, pickle.HIGHEST_PROTOCOL]:
+        for dom in [dhtmlparser.parseString(inp),
+                    dhtmlparser.parseString(inp, options=options)]:
+            copy = pickle.loads(pickle.dumps(dom, protocol))
+            div = copy.getElementById("a")
+            p = copy.find("p")[0]
+
+            assert copy.toString() == dom.toString()
+            assert div.endtag.openertag is div
+            assert p.params["class"] == "x"
+
+            # changes of the copy are seen, the original is not changed
+            p.params["class"] = "y"
+            p.childs.append(dhtmlparser.HTMLElement("<b>"))
+            assert copy.getElementsByClassName("y") == [p]
+            assert len(copy.find("b")) == 1
+            assert div.toString() == '<div id="a"><p class="y">text<b></p>' \
+                                     '<br></div>'
+            assert "<b>" not in dom.toString()
+
+
+def test_parser_options_threads():
+    xml = dhtmlparser.ParserOptions(cip=False, nonpair_tags=[])
+    errors = []
+
+    def parse(options, nonpair):
+        for _ in range(50):
+            dom = dhtmlparser.parseString(
+                '<x A="1"><br></br></x>' * 20,
+                options=options
+            )
+
+            if dom.find("br")[0].isNonPairTag() != nonpair:
+                errors.append(options)
+            if ("a" in dom.find("x")[0].params) != options.cip:
+                errors.append(options)
+
+    threads = [
+        threading.Thread(target=parse, args=(options, nonpair))
+        for options, nonpair in [(xml, False),
+                                 (dhtmlparser.ParserOptions(), True)] * 2
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert gc.isenabled()
+
+
+def test_paused_gc():
+    with dhtmlparser.paused_gc():
+        with dhtmlparser.paused_gc():
+            assert not gc.isenabled()
+
+        assert not gc.isenabled()  # the outer block is still running
+
+    assert gc.isenabled()
+
+    with pytest.raises(ValueError):
+        with dhtmlparser.paused_gc():
+            raise ValueError()
+
+    assert gc.isenabled()
+
+
+@pytest.mark.skipif(not hasattr(gc, "freeze"), reason="requires gc.freeze()")
+def test_freeze_gc():
+    options = dhtmlparser.ParserOptions(freeze_gc=True)
+
+    try:
+        dom = dhtmlparser.parseString("<html><body>x</body></html>",
+                                      options=options)
+        assert gc.get_freeze_count()
+        assert dom.find("body")
+    finally:
+        dhtmlparser.gc_policy.unfreeze()
+
+    assert not gc.get_freeze_count()
+
+
+def test_parseEvents():
+    class Handler(object):
+        def __init__(self):
+            self.events = []
+
+        def start(self, tag, params):
+            self.events.append(("start", tag, dict(params)))
+
+        def end(self, tag):
+            self.events.append(("end", tag))
+
+        def text(self, data):
+            self.events.append(("text", data))
+
+        def comment(self, data):
+            self.events.append(("comment", data))
+
+    handler = Handler()
+    dhtmlparser.parseEvents(
+        """<html><!-- c --><tag PARAM="true">x<br></html>""",
+        handler
+    )
+
+    assert handler.events == [
+        ("start", "html", {}),
+        ("comment", "<!-- c -->"),
+        ("start", "tag", {"PARAM": "true"}),
+        ("text", "x"),
+        ("start", "br", {}),
+        ("end", "br"),
+        ("end", "html"),
+    ]
+
+
+def test_parseEvents_partial_handler():
+    class Handler(object):
+        def __init__(self):
+            self.links = []
+
+        def start(self, tag, params):
+            if "href" in params:
+                self.links.append(params["href"])
+
+    handler = Handler()
+    dhtmlparser.parseEvents('<a HREF="x">a</a><a href=y />', handler)
+
+    assert handler.links == ["x", "y"]
+
+
+def test_parseEvents_bom():
+    class Handler(object):
+        def __init__(self):
+            self.events = []
+
+        def start(self, tag, params):
+            self.events.append(("start", tag))
+
+        def text(self, data):
+            self.events.append(("text", data))
+
+    for bom in (u"\ufeff", u"\xef\xbb\xbf"):
+        handler = Handler()
+        dhtmlparser.parseEvents(bom + u"<a>x</a>", handler)
+
+        assert handler.events == [("start", "a"), ("text", "x")]
+        dom = dhtmlparser.parseString(bom + u"<a>x</a>")
+        assert dom.childs[0].getTagName() == "a"
+
+
+def test_parseEvents_long_input():
+    class Handler(object):
+        def __init__(self):
+            self.tags = 0
+            self.data = ""
+
+        def start(self, tag, params):
+            assert params == {"id": "x" * 1000}
+            self.tags += 1
+
+        def text(self, data):
+            self.data += data
+
+    handler = Handler()
+    dhtmlparser.parseEvents(
+        200 * ('<a id="%s">text</a>' % ("x" * 1000)) + "<unfinished",
+        handler
+    )
+
+    assert handler.tags == 200
+    assert handler.data == 200 * "text" + "<unfinished"
+
+
+def test_IterParser():
+    parser = dhtmlparser.IterParser(["<a><b>x</b", "><c></a>"])
+    events = [(event, el.getTagName()) for event, el in parser]
+
+    assert events == [
+        ("start", "a"),
+        ("start", "b"),
+        ("end", "b"),
+        ("start", "c"),
+        ("end", "c"),
+        ("end", "a"),
+    ]
+    assert parser.root.__str__() == "<a><b>x</b><c></a>"
+
+
+def test_IterParser_binary_file():
+    text = u"P\u0159\u00edli\u0161"
+    parser = dhtmlparser.IterParser(
+        io.BytesIO((u"<p>%s</p><br>" % text).encode("utf-8")),
+        events=("end",),
+        chunk_size=3,
+    )
+
+    assert [el.getTagName() for _, el in parser] == ["p", "br"]
+
+    content = first(parser.root.find("p")).getContent()
+    if not isinstance(content, type(text)):  # python 2 keeps the bytes
+        content = content.decode("utf-8")
+
+    assert content == text
+
+
+def test_IterParser_detach_and_clear():
+    inp = "<root><item>1</item><item>2</item><other /></root>"
+
+    parser = dhtmlparser.IterParser(inp, events=("end",))
+    for event, el in parser:
+        if el.getTagName() == "item":
+            parser.detach(el)
+
+    assert parser.root.__str__() == "<root><other /></root>"
+
+    items = []
+    parser = dhtmlparser.IterParser(inp, events=("end",))
+    for event, el in parser:
+        if el.getTagName() == "item":
+            items.append(el.getContent())
+            parser.clear()
+
+    assert items == ["1", "2"]
+    assert parser.root.__str__() == "<root><other /></root>"
+
+
+def test_IterParser_clear_unclosed():
+    xml = dhtmlparser.ParserOptions(nonpair_tags=[])
+    inp = "<root>" + 1000 * "<product><br>x</product>" + "</br></root>"
+
+    parser = dhtmlparser.IterParser(inp, events=("end",), options=xml)
+    unpaired = parser._builder._unpaired
+    for event, el in parser:
+        if el.getTagName() == "product":
+            assert el.__str__() == "<product><br>x</product>"
+            parser.clear()
+
+            # the unclosed <br> tags are only counted, not kept
+            assert len(unpaired["br"]) == 1
+            assert unpaired["br"][0].__class__ is int
+            assert not unpaired["product"]
+
+    # end tag is still paired with one of the unclosed <br> tags
+    assert parser.root.__str__() == "<root></root>"
+
+
 def test_makeDoubleLinked():
     dom = dhtmlparser.parseString(
         """<html><tag PARAM="true"></html>"""
@@ -7,6 +7,7 @@
 import pytest
 
 from dhtmlparser.specialdict import SpecialDict, _lower_if_str
+from dhtmlparser.specialdict import CaseInsensitiveDict
 
 
 # Variables ===================================================================
@@ -102,3 +103,48 @@ def test_lower_if_str():
     assert _lower_if_str("ASD") == "asd"
     assert _lower_if_str(u"ASD") == u"asd"
     assert _lower_if_str(123) == 123
+
+
+def test_case_insensitive_dict():
+    cid = CaseInsensitiveDict([
+        ("a", "b"),
+        ("A", "B"),
+        ("b", "c"),
+        ("X", "Y"),
+    ])
+
+    assert len(cid) == 3
+    assert list(cid.keys()) == ["A", "b", "X"]
+    assert list(cid.items()) == [("A", "B"), ("b", "c"), ("X", "Y")]
+
+    assert "a" in cid
+    assert "B" in cid
+    assert "y" not in cid
+    assert cid["x"] == "Y"
+    assert cid.get("y", "Nope") == "Nope"
+
+    with pytest.raises(KeyError):
+        cid["y"]
+
+    # same as SpecialDict
+    assert cid == SpecialDict(cid)
+    assert cid == {"a": "B", "B": "c", "x": "Y"}
+    assert cid != {"a": "B"}
+
+
+def test_case_insensitive_dict_changes():
+    cid = CaseInsensitiveDict(ID="1")
+
+    cid["id"] = "2"
+    assert list(cid.items()) == [("id", "2")]
+
+    cid["Class"] = "c"
+    assert cid.pop("CLASS") == "c"
+    assert "class" not in cid
+
+    cid.setdefault("Title", "t")
+    del cid["title"]
+    assert list(cid.keys()) == ["id"]
+
+    cid.clear()
+    assert not cid